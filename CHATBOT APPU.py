@@ -1,67 +1,210 @@
 import random
+import re
+import string
 from datetime import datetime
 
+GREETING = "Hello! I'm a simple chatbot. What's your name?"
+
+JOKES = [
+    "Why did the scarecrow win an award? Because he was outstanding in his field!",
+    "Why don't scientists trust atoms? Because they make up everything!",
+    "What do you call fake spaghetti? An impasta!"
+]
+
+FACTS = [
+    "Did you know honey never spoils? Archaeologists have found pots of honey in ancient Egyptian tombs that are over 3000 years old and still edible!",
+    "Bananas are berries, but strawberries aren't!",
+    "Octopuses have three hearts!"
+]
+
+# Intents and their keywords, in priority order: when an utterance matches
+# several, the one listed first wins. Keywords only match whole words.
+INTENTS = [
+    ('greeting', ['hello', 'hi']),
+    ('how_are_you', ['how are you']),
+    ('name', ['what is your name']),
+    ('help', ['help']),
+    ('bye', ['bye', 'goodbye', 'exit']),
+    ('weather', ['weather']),
+    ('time', ['time']),
+    ('favorite', ['favorite']),
+    ('joke', ['tell me a joke']),
+    ('sad', ['sad', 'bad']),
+    ('happy', ['happy', 'good']),
+    ('fun_fact', ['fun fact']),
+    ('feedback', ['feedback']),
+]
+
+
+# Punctuation -> space, so str.split() leaves just the words
+WORD_SEPARATORS = str.maketrans(dict.fromkeys(string.punctuation, ' '))
+COLOR_PATTERN = re.compile(r'\bcolor\b', re.IGNORECASE)
+FOOD_PATTERN = re.compile(r'\bfood\b', re.IGNORECASE)
+
+
+class IntentTable:
+    """Keywords of every intent, precompiled for one pass over each utterance
+
+    The text is split into words once and looked up by hash in a single set
+    intersection, so the cost grows with the length of the text, not with
+    the number of intents, and 'hi' no longer fires on 'this'. Keywords of
+    several words are only compared when their first word is present.
+    """
+
+    def __init__(self, intents):
+        self.intents = [intent for intent, _ in intents]
+        self.words = {}  # One-word keyword -> priority of its intent
+        self.phrases = {}  # First word of a longer keyword -> [(priority, remaining words)]
+        for priority, (_, keywords) in enumerate(intents):
+            for keyword in keywords:
+                first, *rest = keyword.lower().split()
+                if rest:
+                    self.phrases.setdefault(first, []).append((priority, rest))
+                else:
+                    self.words.setdefault(first, priority)
+        self.vocabulary = frozenset(self.words) | frozenset(self.phrases)
+
+    def match(self, text):
+        """Highest-priority intent with a keyword in the text, or None"""
+        words = text.lower().translate(WORD_SEPARATORS).split()
+        present = self.vocabulary.intersection(words)
+        if not present:
+            return None
+        best = len(self.intents)
+        for word in present:
+            priority = self.words.get(word, best)
+            if priority < best:
+                best = priority
+        for word in present & self.phrases.keys():
+            for priority, rest in self.phrases[word]:
+                if priority < best and self._has_phrase(words, word, rest):
+                    best = priority
+        return self.intents[best] if best < len(self.intents) else None
+
+    @staticmethod
+    def _has_phrase(words, first, rest):
+        i = words.index(first)
+        while True:
+            if words[i + 1:i + 1 + len(rest)] == rest:
+                return True
+            try:
+                i = words.index(first, i + 1)
+            except ValueError:
+                return False
+
+
+INTENT_TABLE = IntentTable(INTENTS)
+ANSWER_INTENTS = {question: f'{question}_answer' for question in ('name', 'color', 'food', 'feedback')}
+
+
+def match_intent(text):
+    """Highest-priority intent whose keyword appears as whole words in the text, or None"""
+    return INTENT_TABLE.match(text)
+
+
+class ChatSession:
+    """One conversation: the user's name, what they told us, and the question we're waiting on
+
+    Slotted so that a server holding thousands of idle sessions keeps each
+    one to a few small objects.
+    """
+    __slots__ = ('user_name', 'preferences', 'expecting', 'rng', 'clock', 'done', 'last_active')
+
+    def __init__(self, user_name=None, rng=random, clock=datetime.now):
+        self.user_name = user_name
+        self.preferences = {}
+        # 'name', 'color', 'food' or 'feedback' while the next message answers a question
+        self.expecting = 'name' if user_name is None else None
+        self.rng = rng  # Picks jokes and facts; pass a seeded random.Random for repeatable replies
+        self.clock = clock  # Gives the time for 'time' replies
+        self.done = False  # Set once the user says goodbye
+        self.last_active = 0.0  # For servers evicting idle sessions
+
+
+def converse(session, text):
+    """(intent, reply) for one message, updating the session
+
+    The intent is one of INTENTS, 'unknown', or '<question>_answer' when the
+    message answers a follow-up question (name, color, food or feedback).
+    """
+    expecting = session.expecting
+    if expecting is not None:
+        return ANSWER_INTENTS[expecting], _answer(session, expecting, text)
+    intent = match_intent(text) or 'unknown'
+    return intent, _reply(session, intent, text)
+
+
+def respond(session, text):
+    """The chatbot's reply to one message, updating the session"""
+    return converse(session, text)[1]
+
+
+def _answer(session, expecting, text):
+    session.expecting = None
+    if expecting == 'name':
+        session.user_name = text
+        return f"Nice to meet you, {text}! How can I help you today?"
+    if expecting == 'feedback':
+        return f"Thank you for your feedback: '{text}'. I'll try to improve!"
+    session.preferences[expecting] = text
+    if expecting == 'color':
+        return f"Nice! I will remember that your favorite color is {text}."
+    return f"Great! I will remember that your favorite food is {text}."
+
+
+def _reply(session, intent, text):
+    if intent == 'greeting':
+        return f"Hi there, {session.user_name}! How can I assist you?"
+    if intent == 'how_are_you':
+        return "I'm just a computer program, but thanks for asking! How are you?"
+    if intent == 'name':
+        return "I'm a simple chatbot created to help you."
+    if intent == 'help':
+        return "Sure! What do you need help with?"
+    if intent == 'bye':
+        session.done = True
+        return "Goodbye! Have a great day!"
+    if intent == 'weather':
+        return "I'm not sure about the weather, but you can check a weather website."
+    if intent == 'time':
+        current_time = session.clock().strftime("%H:%M:%S")
+        return f"The current time is {current_time}."
+    if intent == 'favorite':
+        if COLOR_PATTERN.search(text):
+            session.expecting = 'color'
+            return "What's your favorite color?"
+        if FOOD_PATTERN.search(text):
+            session.expecting = 'food'
+            return "What's your favorite food?"
+        return "I can remember your favorite color or food. Which one would you like to share?"
+    if intent == 'joke':
+        return session.rng.choice(JOKES)
+    if intent == 'sad':
+        return "I'm sorry to hear that. If you want to talk about it, I'm here to listen."
+    if intent == 'happy':
+        return "That's great to hear! What made you feel that way?"
+    if intent == 'fun_fact':
+        return session.rng.choice(FACTS)
+    if intent == 'feedback':
+        session.expecting = 'feedback'
+        return "I appreciate your feedback! What do you think about my responses?"
+    return "I'm sorry, I didn't understand that. Can you please rephrase?"
+
+
 def simple_chatbot():
-    print("Hello! I'm a simple chatbot. What's your name?")
-    user_name = input("You: ")
-    user_preferences = {}
-    
-    print(f"Chatbot: Nice to meet you, {user_name}! How can I help you today?")
-    
-    while True:
-        user_input = input("You: ").lower()
-        
-        # Predefined responses based on user input
-        if "hello" in user_input or "hi" in user_input:
-            print(f"Chatbot: Hi there, {user_name}! How can I assist you?")
-        elif "how are you" in user_input:
-            print("Chatbot: I'm just a computer program, but thanks for asking! How are you?")
-        elif "what is your name" in user_input:
-            print("Chatbot: I'm a simple chatbot created to help you.")
-        elif "help" in user_input:
-            print("Chatbot: Sure! What do you need help with?")
-        elif "bye" in user_input or "exit" in user_input:
-            print("Chatbot: Goodbye! Have a great day!")
-            break
-        elif "weather" in user_input:
-            print("Chatbot: I'm not sure about the weather, but you can check a weather website.")
-        elif "time" in user_input:
-            current_time = datetime.now().strftime("%H:%M:%S")
-            print(f"Chatbot: The current time is {current_time}.")
-        elif "favorite" in user_input:
-            if "color" in user_input:
-                color = input("Chatbot: What's your favorite color? ")
-                user_preferences['color'] = color
-                print(f"Chatbot: Nice! I will remember that your favorite color is {color}.")
-            elif "food" in user_input:
-                food = input("Chatbot: What's your favorite food? ")
-                user_preferences['food'] = food
-                print(f"Chatbot: Great! I will remember that your favorite food is {food}.")
-            else:
-                print("Chatbot: I can remember your favorite color or food. Which one would you like to share?")
-        elif "tell me a joke" in user_input:
-            jokes = [
-                "Why did the scarecrow win an award? Because he was outstanding in his field!",
-                "Why don't scientists trust atoms? Because they make up everything!",
-                "What do you call fake spaghetti? An impasta!"
-            ]
-            print(f"Chatbot: {random.choice(jokes)}")
-        elif "sad" in user_input or "bad" in user_input:
-            print("Chatbot: I'm sorry to hear that. If you want to talk about it, I'm here to listen.")
-        elif "happy" in user_input or "good" in user_input:
-            print("Chatbot: That's great to hear! What made you feel that way?")
-        elif "fun fact" in user_input:
-            facts = [
-                "Did you know honey never spoils? Archaeologists have found pots of honey in ancient Egyptian tombs that are over 3000 years old and still edible!",
-                "Bananas are berries, but strawberries aren't!",
-                "Octopuses have three hearts!"
-            ]
-            print(f"Chatbot: {random.choice(facts)}")
-        elif "feedback" in user_input:
-            feedback = input("Chatbot: I appreciate your feedback! What do you think about my responses? ")
-            print(f"Chatbot: Thank you for your feedback: '{feedback}'. I'll try to improve!")
-        else:
-            print("Chatbot: I'm sorry, I didn't understand that. Can you please rephrase?")
-
-# Run the chatbot
-simple_chatbot()
\ No newline at end of file
+    print(GREETING)
+    session = ChatSession()
+    reply = respond(session, input("You: "))
+    print(f"Chatbot: {reply}")
+
+    while not session.done:
+        reply = respond(session, input("You: "))
+        if session.expecting is not None:
+            # Follow-up questions take their answer on the same line
+            reply = respond(session, input(f"Chatbot: {reply} "))
+        print(f"Chatbot: {reply}")
+
+
+if __name__ == "__main__":
+    # Run the chatbot
+    simple_chatbot()
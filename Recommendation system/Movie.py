@@ -1,31 +1,194 @@
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
 import imdb
-from collections import defaultdict
+import threading
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from collaborative import MatrixFactorization
+from feature_scoring import MovieFeatureMatrices, best_predictions
+from metadata_cache import MetadataCache
+from movie_catalog import MovieCatalog
+from movie_lsh import MinHashLSHIndex, movie_tokens
+from profiling import timed
+from rating_store import RatingStore
+
+
+class UserScoreAccumulator:
+    """Running sum(rating * sim) and sum(sim) for one user's ratings, kept only where sim > 0
+
+    rows holds, in catalog order, the movies sharing a feature with at least
+    one rated movie; weighted and similarity are aligned with it. Movies
+    sharing nothing can never be recommended, so they cost no memory.
+    """
+
+    def __init__(self, features, user_ratings):
+        self.ratings = dict(user_ratings)  # Ratings already folded into the sums
+        self._build(features)
+
+    def _build(self, features):
+        self.replacements = features.replacements
+        self.size = len(features)  # Catalog rows the sums cover
+        weighted, similarity = features.predicted_ratings(
+            features.rated_rows(self.ratings), list(self.ratings.values())
+        )
+        self.rows = np.flatnonzero(similarity)
+        self.weighted, self.similarity = weighted[self.rows], similarity[self.rows]
+
+    def stale(self, features):
+        """Whether movies were overwritten in place since the sums were built"""
+        return self.replacements != features.replacements
+
+    def extend(self, features):
+        """Score catalog rows appended since the sums were last brought up to date"""
+        if self.size < len(features):
+            new_rows = np.arange(self.size, len(features))
+            weighted, similarity = features.predicted_ratings(
+                features.rated_rows(self.ratings), list(self.ratings.values()), new_rows
+            )
+            keep = np.flatnonzero(similarity)
+            self.rows = np.concatenate([self.rows, new_rows[keep]])
+            self.weighted = np.concatenate([self.weighted, weighted[keep]])
+            self.similarity = np.concatenate([self.similarity, similarity[keep]])
+            self.size = len(features)
+
+    def update(self, features, movie_id, rating):
+        """Fold in a new rating with a single column; a changed rating rebuilds the sums"""
+        previous = self.ratings.get(movie_id)
+        if previous is not None:
+            if previous != rating:
+                # Adjusting a term mid-sum wouldn't give the floats of summing in rating order,
+                # which exact scoring does; the rating keeps its place in that order
+                self.ratings[movie_id] = rating
+                self._build(features)
+            return
+        self.extend(features)
+        column = features.similarity_block(features.rated_rows([movie_id]))
+        rows = np.union1d(self.rows, column.indices)
+        if len(rows) > len(self.rows):
+            # Make room for movies similar to nothing rated before
+            kept = np.searchsorted(rows, self.rows)
+            self.weighted, weighted = np.zeros(len(rows)), self.weighted
+            self.similarity, similarity = np.zeros(len(rows)), self.similarity
+            self.weighted[kept], self.similarity[kept] = weighted, similarity
+            self.rows = rows
+        positions = np.searchsorted(self.rows, column.indices)
+        self.weighted[positions] += rating * column.data
+        self.similarity[positions] += column.data
+        self.ratings[movie_id] = rating
+
 
 class IMDBMovieRecommender:
-    def __init__(self):
-        # Initialize the IMDb API
-        self.ia = imdb.IMDb()
+    def __init__(self, ia=None, cache=None, max_concurrent_fetches=5, max_accumulators=64, store=None):
+        # Initialize the IMDb API (any object with get_movie/search_movie works)
+        self.ia = ia if ia is not None else imdb.IMDb()
+        
+        # Optional persistent MetadataCache consulted before the network
+        self.cache = cache
+        
+        # Bounded pool for detail fetches; concurrent requests for one ID share a future
+        self.max_concurrent_fetches = max_concurrent_fetches
+        self._fetch_pool = None
+        self._fetch_lock = threading.Lock()
+        self._in_flight = {}  # IMDb ID -> Future of its details
         
         # Store movie data
-        self.movies = {}  # IMDb ID -> movie object
-        self.movie_ratings = defaultdict(dict)  # user_id -> {movie_id -> rating}
+        self.movies = MovieCatalog()  # IMDb ID -> movie details, stored column-wise
+        # Optional RatingStore persisting ratings across restarts; it stands in for the dict
+        self.store = store
+        self.movie_ratings = store if store is not None else defaultdict(dict)  # user_id -> {movie_id -> rating}
         self.movie_features = {}  # IMDb ID -> feature vector
+        self._feature_matrices = None  # MovieFeatureMatrices built from self.movies
+        self.candidate_index = None  # Optional MinHashLSHIndex for approximate mode
+        
+        # Per-user score accumulators for recently active users, least recently used first;
+        # each holds 24 bytes per movie similar to one the user rated
+        self.max_accumulators = max_accumulators
+        self._accumulators = OrderedDict()  # user_id -> UserScoreAccumulator
+        
+        # Optional collaborative-filtering model trained on movie_ratings
+        self.collaborative = None
+        
+        # Optional profiling.StageTimer recording fetch/similarity/ranking timings
+        self.timer = None
         
     def fetch_movie_details(self, movie_id):
         """Fetch movie details from IMDb"""
-        if movie_id not in self.movies:
-            movie = self.ia.get_movie(movie_id)
-            self.movies[movie_id] = {
-                'title': movie.get('title', ''),
-                'year': movie.get('year', ''),
-                'genres': movie.get('genres', []),
-                'director': [d.get('name', '') for d in movie.get('directors', [])],
-                'cast': [a.get('name', '') for a in movie.get('cast', [])[:5]],
-                'rating': movie.get('rating', 0.0)
-            }
-        return self.movies[movie_id]
+        if movie_id in self.movies:
+            return self.movies[movie_id]
+        return self._movie_future(movie_id).result()
+
+    def fetch_many(self, movie_ids):
+        """Fetch details for many movies concurrently, returning {movie_id: details}"""
+        futures = {movie_id: self._movie_future(movie_id) for movie_id in dict.fromkeys(movie_ids)}
+        return {movie_id: future.result() for movie_id, future in futures.items()}
+
+    def _movie_future(self, movie_id):
+        """Return a future for the movie's details, joining any fetch already in flight"""
+        with self._fetch_lock:
+            if movie_id in self.movies:
+                future = Future()
+                future.set_result(self.movies[movie_id])
+                return future
+            future = self._in_flight.get(movie_id)
+            if future is None:
+                if self._fetch_pool is None:
+                    self._fetch_pool = ThreadPoolExecutor(max_workers=self.max_concurrent_fetches)
+                future = self._fetch_pool.submit(self._load_movie, movie_id)
+                self._in_flight[movie_id] = future
+            return future
+
+    def _load_movie(self, movie_id):
+        """Load one movie from the cache or IMDb and add it to the catalog"""
+        try:
+            details = self.cache.get(movie_id) if self.cache is not None else None
+            if details is None:
+                with timed(self.timer, 'fetch'):
+                    movie = self.ia.get_movie(movie_id)
+                details = {
+                    'title': movie.get('title', ''),
+                    'year': movie.get('year', ''),
+                    'genres': movie.get('genres', []),
+                    'director': [d.get('name', '') for d in movie.get('directors', [])],
+                    'cast': [a.get('name', '') for a in movie.get('cast', [])[:5]],
+                    'rating': movie.get('rating', 0.0)
+                }
+                if self.cache is not None:
+                    self.cache.put(movie_id, details)
+            with self._fetch_lock:
+                self.movies[movie_id] = details
+                self._feature_matrices = None
+            return details
+        finally:
+            with self._fetch_lock:
+                self._in_flight.pop(movie_id, None)
+
+    def close(self):
+        """Shut down the fetch pool, write the cache's pending access times and close the rating store"""
+        if self._fetch_pool is not None:
+            self._fetch_pool.shutdown()
+            self._fetch_pool = None
+        if self.cache is not None:
+            self.cache.flush()
+        if self.store is not None:
+            self.store.maybe_compact()
+            self.store.close()
+
+    def frozen_catalog(self):
+        """Context manager keeping fetched details out of the catalog while held, e.g. to snapshot it"""
+        return self._fetch_lock
+
+    def load_cached_movies(self):
+        """Load every fresh cached movie into the catalog without touching the network"""
+        if self.cache is None:
+            return 0
+        loaded = 0
+        for movie_id, details in self.cache.items():
+            if movie_id not in self.movies:
+                self.movies[movie_id] = details
+                loaded += 1
+        if loaded:
+            self._feature_matrices = None
+        return loaded
 
     def search_movie(self, title):
         """Search for a movie by title"""
@@ -33,12 +196,12 @@ class IMDBMovieRecommender:
         if not movies:
             return None
         
-        # Return the top 5 matches
+        # Return the top 5 matches, fetching their full details concurrently
+        movie_ids = [movie.getID() for movie in movies[:5]]
+        fetched = self.fetch_many(movie_ids)
         results = []
-        for movie in movies[:5]:
-            movie_id = movie.getID()
-            # Fetch full movie details
-            details = self.fetch_movie_details(movie_id)
+        for movie_id in movie_ids:
+            details = fetched[movie_id]
             results.append({
                 'id': movie_id,
                 'title': details['title'],
@@ -55,68 +218,171 @@ class IMDBMovieRecommender:
         # Ensure we have movie details
         self.fetch_movie_details(movie_id)
         self.movie_ratings[user_id][movie_id] = rating
+        if self.store is not None:
+            self.store.log(user_id, movie_id, rating)
+        
+        # Only this movie's contribution changes for a user with live accumulators
+        accumulator = self._accumulators.get(user_id)
+        if accumulator is not None:
+            features = self.feature_matrices()
+            if accumulator.stale(features):
+                del self._accumulators[user_id]
+            else:
+                accumulator.update(features, movie_id, rating)
+        
+        # Keep the user's collaborative vector current without retraining
+        if self.collaborative is not None:
+            self.collaborative.fold_in(user_id, self.movie_ratings[user_id])
         
     def calculate_movie_similarity(self, movie_id1, movie_id2):
         """Calculate similarity between two movies based on features"""
-        movie1 = self.movies[movie_id1]
-        movie2 = self.movies[movie_id2]
+        # Interned integer ID sets instead of sets of name strings
+        genres1, directors1, cast1 = self.movies.feature_sets(movie_id1)
+        genres2, directors2, cast2 = self.movies.feature_sets(movie_id2)
         
         # Calculate genre similarity
-        genres1 = set(movie1['genres'])
-        genres2 = set(movie2['genres'])
         genre_sim = len(genres1.intersection(genres2)) / len(genres1.union(genres2)) if genres1 or genres2 else 0
         
         # Calculate director similarity
-        directors1 = set(movie1['director'])
-        directors2 = set(movie2['director'])
         director_sim = len(directors1.intersection(directors2)) / len(directors1.union(directors2)) if directors1 or directors2 else 0
         
         # Calculate cast similarity
-        cast1 = set(movie1['cast'])
-        cast2 = set(movie2['cast'])
         cast_sim = len(cast1.intersection(cast2)) / len(cast1.union(cast2)) if cast1 or cast2 else 0
         
         # Weighted similarity
         return 0.5 * genre_sim + 0.3 * director_sim + 0.2 * cast_sim
 
-    def get_recommendations(self, user_id, n_recommendations=5):
+    def feature_matrices(self):
+        """Return the sparse feature matrices, rebuilding them if the catalog changed"""
+        features = self._feature_matrices
+        if features is None or len(features) != len(self.movies) or \
+                features.replacements != self.movies.replacements:
+            self._feature_matrices = MovieFeatureMatrices.from_movies(self.movies)
+        return self._feature_matrices
+
+    def enable_approximate(self, num_perm=64, bands=32, seed=1):
+        """Build a MinHash/LSH index used by get_recommendations(approximate=True)"""
+        self.candidate_index = MinHashLSHIndex(num_perm=num_perm, bands=bands, seed=seed)
+        self._indexed_movies = 0
+        self._indexed_replacements = self.movies.replacements
+        self._sync_candidate_index()
+
+    def _sync_candidate_index(self):
+        if self._indexed_replacements != self.movies.replacements:
+            # Movies overwritten in place keep their row but need a new signature
+            rows = self.movies.replaced_since(self._indexed_replacements)
+            if rows is None:
+                # More replacements than the catalog remembers: index everything again
+                self.candidate_index.clear()
+                self._indexed_movies = 0
+            else:
+                for row in dict.fromkeys(rows):
+                    if row < self._indexed_movies:
+                        self.candidate_index.remove(row)
+                        self.candidate_index.add(row, movie_tokens(self.movies[self.movies.movie_id(row)]))
+            self._indexed_replacements = self.movies.replacements
+        # Movies are otherwise only appended to the catalog, so index the new tail by row
+        for row in range(self._indexed_movies, len(self.movies)):
+            self.candidate_index.add(row, movie_tokens(self.movies[self.movies.movie_id(row)]))
+        self._indexed_movies = len(self.movies)
+
+    def candidate_rows(self, rated_movie_ids):
+        """Catalog rows of movies that LSH deems likely similar to any rated movie"""
+        self._sync_candidate_index()
+        candidates = set()
+        for movie_id in rated_movie_ids:
+            candidates.update(self.candidate_index.query(self.movies.row(movie_id)))
+        return np.unique(np.fromiter(candidates, dtype=np.int64, count=len(candidates)))
+
+    def user_accumulator(self, user_id):
+        """Return the user's score accumulator, building it if missing or out of sync"""
+        features = self.feature_matrices()
+        user_ratings = self.movie_ratings[user_id]
+        accumulator = self._accumulators.get(user_id)
+        if accumulator is None or accumulator.ratings != user_ratings or accumulator.stale(features):
+            # Ratings changed behind add_user_rating's back, so start over
+            accumulator = UserScoreAccumulator(features, user_ratings)
+            self._accumulators[user_id] = accumulator
+            if len(self._accumulators) > self.max_accumulators:
+                self._accumulators.popitem(last=False)
+        else:
+            accumulator.extend(features)
+        self._accumulators.move_to_end(user_id)
+        return accumulator
+
+    def get_recommendations(self, user_id, n_recommendations=5, approximate=False):
         """Get movie recommendations for a user"""
         if user_id not in self.movie_ratings:
             raise ValueError("User not found")
+        if approximate and self.candidate_index is None:
+            raise ValueError("Approximate mode is not enabled")
+        
+        # Ratings restored from a store may name movies this process hasn't fetched yet
+        missing = [movie_id for movie_id in self.movie_ratings[user_id] if movie_id not in self.movies]
+        if missing:
+            self.fetch_many(missing)
             
-        # Get movies rated by the user
-        rated_movies = set(self.movie_ratings[user_id].keys())
+        with timed(self.timer, 'similarity'):
+            features = self.feature_matrices()
+            user_ratings = self.movie_ratings[user_id]
+            rated_rows = features.rated_rows(user_ratings)
+            if approximate:
+                # Score only LSH candidates against all rated movies in one batched pass
+                rows = self.candidate_rows(user_ratings)
+                weighted, similarity = features.predicted_ratings(rated_rows, list(user_ratings.values()), rows)
+            else:
+                # Running sums already cover every rating the user has made
+                accumulator = self.user_accumulator(user_id)
+                rows, weighted, similarity = accumulator.rows, accumulator.weighted, accumulator.similarity
+        
+        with timed(self.timer, 'ranking'):
+            # Only unrated movies with at least one similar rated movie are candidates,
+            # and a partial selection picks the top n instead of sorting all of them;
+            # both touch the candidate rows only, not the whole catalog
+            positions, scores = best_predictions(weighted, similarity, np.isin(rows, rated_rows), n_recommendations)
+            
+            recommendations = []
+            for position, score in zip(positions, scores):
+                row = rows[position]
+                recommendations.append((
+                    features.movie_id(row),
+                    float(score),
+                    self.movies.title(row),
+                    self.movies.year(row)
+                ))
+        return recommendations
+
+    def train_collaborative(self, warm_start=True, **params):
+        """Train matrix factorization on all ratings, starting from the last model if any"""
+        if self.collaborative is None or not warm_start:
+            self.collaborative = MatrixFactorization(**params).fit(self.movie_ratings)
+        else:
+            self.collaborative.fit(self.movie_ratings, warm_start=True)
+        return self.collaborative
+
+    def get_collaborative_recommendations(self, user_id, n_recommendations=5):
+        """Get movie recommendations for a user from the collaborative model"""
+        if user_id not in self.movie_ratings:
+            raise ValueError("User not found")
+        if self.collaborative is None:
+            raise ValueError("Collaborative model is not trained")
+        
+        predicted = self.collaborative.recommend(user_id, n_recommendations, self.movie_ratings[user_id])
+        # The model also knows movies that only appear in ratings restored from a store
+        missing = [movie_id for movie_id, _ in predicted if movie_id not in self.movies]
+        if missing:
+            self.fetch_many(missing)
         
-        # Calculate recommendations
         recommendations = []
-        for movie_id in self.movies:
-            if movie_id not in rated_movies:
-                # Calculate weighted rating based on similar movies
-                similarity_scores = []
-                weighted_ratings = []
-                
-                for rated_movie_id, rating in self.movie_ratings[user_id].items():
-                    similarity = self.calculate_movie_similarity(movie_id, rated_movie_id)
-                    if similarity > 0:
-                        similarity_scores.append(similarity)
-                        weighted_ratings.append(rating * similarity)
-                
-                if similarity_scores:
-                    predicted_rating = sum(weighted_ratings) / sum(similarity_scores)
-                    recommendations.append((
-                        movie_id,
-                        predicted_rating,
-                        self.movies[movie_id]['title'],
-                        self.movies[movie_id]['year']
-                    ))
-        
-        # Sort by predicted rating and return top n
-        recommendations.sort(key=lambda x: x[1], reverse=True)
-        return recommendations[:n_recommendations]
+        for movie_id, rating in predicted:
+            row = self.movies.row(movie_id)
+            recommendations.append((movie_id, rating, self.movies.title(row), self.movies.year(row)))
+        return recommendations
 
 def main():
-    # Initialize recommender
-    recommender = IMDBMovieRecommender()
+    # Initialize recommender, reusing metadata fetched and ratings made by earlier runs
+    recommender = IMDBMovieRecommender(cache=MetadataCache('movie_cache.sqlite3'), store=RatingStore('movie_ratings'))
+    recommender.load_cached_movies()
     
     while True:
         print("\n1. Search for a movie")
@@ -171,6 +437,8 @@ def main():
             
         else:
             print("Invalid choice. Please try again.")
+    
+    recommender.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
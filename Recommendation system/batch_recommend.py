@@ -0,0 +1,139 @@
+import argparse
+import json
+import os
+import time
+from collections import deque
+from multiprocessing import Pool
+
+import numpy as np
+
+from Movie import IMDBMovieRecommender
+from feature_scoring import best_predictions
+from ingest import ingest_ratings
+from metadata_cache import MetadataCache
+from synthetic import synthetic_catalog, synthetic_user_ratings
+from shared_features import attach_features, publish_features
+
+# Feature matrices attached once per worker process
+_worker = {}
+
+
+def _init_worker(handle):
+    _worker['block'], _worker['features'] = attach_features(handle)
+
+
+def _score_users(batch):
+    """Top-N rows and predicted ratings for a batch of (user_id, rated_rows, ratings)"""
+    features = _worker['features']
+    n_recommendations, users = batch
+    results = []
+    for user_id, rated_rows, ratings in users:
+        weighted, similarity = features.predicted_ratings(rated_rows, ratings)
+        is_rated = np.zeros(len(features), dtype=bool)
+        is_rated[rated_rows] = True
+        positions, scores = best_predictions(weighted, similarity, is_rated, n_recommendations)
+        results.append((user_id, positions.tolist(), scores.tolist()))
+    return results
+
+
+def _user_batches(recommender, features, n_recommendations, batch_size, skipped):
+    batch = []
+    for user_id, user_ratings in recommender.movie_ratings.items():
+        # Ratings loaded without fetching may name movies the catalog doesn't have
+        known = {movie_id: rating for movie_id, rating in user_ratings.items() if movie_id in features.catalog}
+        skipped['ratings'] += len(user_ratings) - len(known)
+        if not known:
+            skipped['users'] += 1
+            continue
+        batch.append((user_id, features.rated_rows(known), list(known.values())))
+        if len(batch) == batch_size:
+            yield n_recommendations, batch
+            batch = []
+    if batch:
+        yield n_recommendations, batch
+
+
+def _write_results(output, features, results):
+    for user_id, rows, scores in results:
+        recommendations = [[features.movie_id(row), round(score, 6)] for row, score in zip(rows, scores)]
+        output.write(json.dumps({'user_id': user_id, 'recommendations': recommendations}) + '\n')
+    return len(results)
+
+
+def run_batch(recommender, output_path, n_recommendations=10, processes=None, batch_size=64, max_pending=None):
+    """Write top-N recommendations for every user to a JSONL file using a process pool
+
+    At most max_pending batches (default two per process) are submitted
+    but not yet written, so users are read and scored in bounded memory.
+    Ratings of movies missing from the catalog are left out and counted;
+    users left with no ratings get no line.
+    """
+    processes = processes or os.cpu_count()
+    max_pending = max_pending or 2 * processes
+    features = recommender.feature_matrices()
+    block, handle = publish_features(features)
+    start = time.perf_counter()
+    users = 0
+    skipped = {'ratings': 0, 'users': 0}
+    try:
+        with Pool(processes, initializer=_init_worker, initargs=(handle,)) as pool, \
+                open(output_path, 'w') as output:
+            # Written oldest first, keeping the output in user order while workers run ahead;
+            # unlike imap, which drains the whole generator up front, only a window is in flight
+            pending = deque()
+            for batch in _user_batches(recommender, features, n_recommendations, batch_size, skipped):
+                pending.append(pool.apply_async(_score_users, (batch,)))
+                if len(pending) >= max_pending:
+                    users += _write_results(output, features, pending.popleft().get())
+            while pending:
+                users += _write_results(output, features, pending.popleft().get())
+    finally:
+        block.close()
+        block.unlink()
+    elapsed = time.perf_counter() - start
+    return {'users': users, 'seconds': elapsed, 'users_per_sec': users / elapsed if elapsed else 0.0,
+            'skipped_ratings': skipped['ratings'], 'skipped_users': skipped['users']}
+
+
+def load_ratings_csv(recommender, path):
+    """Load user_id,movie_id,rating rows (with a header) into the recommender"""
+    return ingest_ratings(recommender, path, fetch=False, progress=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute top-N movie recommendations for every user")
+    parser.add_argument('--output', default='recommendations.jsonl')
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--cache', help="MetadataCache file holding the movie catalog")
+    parser.add_argument('--ratings', help="CSV of user_id,movie_id,rating")
+    parser.add_argument('--synthetic-movies', type=int, default=20000)
+    parser.add_argument('--synthetic-users', type=int, default=2000)
+    parser.add_argument('--ratings-per-user', type=int, default=30)
+    args = parser.parse_args()
+    if args.cache and not args.ratings:
+        parser.error("--cache needs --ratings")
+
+    if args.cache:
+        recommender = IMDBMovieRecommender(cache=MetadataCache(args.cache))
+        recommender.load_cached_movies()
+        load_ratings_csv(recommender, args.ratings)
+    else:
+        # Synthetic catalog and ratings for measuring throughput
+        recommender = IMDBMovieRecommender(ia=object())
+        recommender.movies.update(synthetic_catalog(args.synthetic_movies))
+        recommender.movie_ratings.update(
+            synthetic_user_ratings(recommender.movies, args.synthetic_users, args.ratings_per_user)
+        )
+
+    stats = run_batch(recommender, args.output, args.top, args.processes, args.batch_size)
+    print(f"{stats['users']} users in {stats['seconds']:.2f}s "
+          f"({stats['users_per_sec']:.1f} users/sec on {args.processes} processes)")
+    if stats['skipped_ratings']:
+        print(f"skipped {stats['skipped_ratings']} ratings of movies missing from the catalog "
+              f"({stats['skipped_users']} users had no others)")
+
+
+if __name__ == "__main__":
+    main()
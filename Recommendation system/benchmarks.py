@@ -0,0 +1,184 @@
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+import numpy as np
+
+from Movie import IMDBMovieRecommender
+from books import BookRecommender
+from fake_backends import FakeGoogleBooks, FakeIMDb, serve_fake_books
+from profiling import StageTimer
+from synthetic import synthetic_books, synthetic_catalog, synthetic_user_ratings
+
+
+class CallCounter:
+    """Wraps a bound method on one recommender instance and counts its calls"""
+
+    def __init__(self, obj, name):
+        self.name = name
+        self.calls = 0
+        self._method = getattr(obj, name)
+        setattr(obj, name, self)
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        return self._method(*args, **kwargs)
+
+
+def measure(name, func, requests, backend=None, counters=(), trace_memory=False):
+    """Run func once per request and summarize latency, peak memory and calls per request"""
+    if backend is not None:
+        backend.calls.clear()
+    for counter in counters:
+        counter.calls = 0
+    if trace_memory:
+        tracemalloc.start()
+    latencies = []
+    for request in requests:
+        start = time.perf_counter()
+        func(request)
+        latencies.append(time.perf_counter() - start)
+    result = {'scenario': name, 'requests': len(latencies)}
+    if trace_memory:
+        result['peak_mib'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    latencies = np.array(latencies) * 1000
+    for percentile in (50, 90, 99):
+        result[f'p{percentile}_ms'] = float(np.percentile(latencies, percentile))
+    result['max_ms'] = float(latencies.max())
+    calls = dict(backend.calls) if backend is not None else {}
+    calls.update({counter.name: counter.calls for counter in counters})
+    for call, count in calls.items():
+        result[f'{call}_per_request'] = count / len(latencies)
+    return result
+
+
+def movie_scenarios(n_movies, n_users, ratings_per_user, n_requests, latency, trace_memory):
+    catalog = synthetic_catalog(n_movies)
+    backend = FakeIMDb(catalog, latency=latency)
+    rng = random.Random(0)
+    results = []
+
+    # Cold fetches and searches against the fake backend
+    recommender = IMDBMovieRecommender(ia=backend)
+    movie_ids = rng.sample(list(catalog), n_requests)
+    results.append(measure('movie fetch (cold)', recommender.fetch_movie_details, movie_ids, backend,
+                           trace_memory=trace_memory))
+    titles = ['Movie %d' % rng.randrange(n_movies) for _ in range(n_requests)]
+    results.append(measure('movie search', recommender.search_movie, titles, backend, trace_memory=trace_memory))
+    recommender.close()
+
+    # Scoring on a fully loaded catalog
+    recommender = IMDBMovieRecommender(ia=backend)
+    recommender.movies.update(catalog)
+    recommender.movie_ratings.update(synthetic_user_ratings(catalog, n_users, ratings_per_user))
+    recommender.timer = StageTimer()
+    pairs = [tuple(rng.sample(movie_ids, 2)) for _ in range(n_requests)]
+    results.append(measure('movie similarity', lambda pair: recommender.calculate_movie_similarity(*pair), pairs,
+                           trace_memory=trace_memory))
+    users = [rng.randrange(n_users) for _ in range(n_requests)]
+    results.append(measure('movie recommendations', recommender.get_recommendations, users,
+                           trace_memory=trace_memory))
+    results[-1]['stages'] = recommender.timer.export()
+    return results
+
+
+def book_scenarios(n_books, n_users, ratings_per_user, n_requests, latency, trace_memory, stub_server=False,
+                   neighbors=50):
+    catalog = synthetic_books(n_books)
+    rng = random.Random(0)
+    results = []
+
+    # Either call the fake in-process or through the pooled session against a local HTTP stub
+    if stub_server:
+        server, base_url = serve_fake_books(catalog, latency=latency)
+        backend = server.backend
+        recommender = BookRecommender(base_url=base_url)
+    else:
+        server = None
+        backend = FakeGoogleBooks(catalog, latency=latency)
+        recommender = BookRecommender(http=backend)
+    book_ids = rng.sample(list(catalog), 2 * n_requests)
+    results.append(measure('book fetch (cold)', recommender.fetch_book_details, book_ids[:n_requests], backend,
+                           trace_memory=trace_memory))
+    titles = ['Book %d' % rng.randrange(n_books) for _ in range(n_requests)]
+    results.append(measure('book search', recommender.search_book, titles, backend, trace_memory=trace_memory))
+    batches = [book_ids[n_requests:][i:i + 10] for i in range(0, n_requests, 10)]
+    results.append(measure('book prefetch x10', recommender.fetch_many, batches, backend, trace_memory=trace_memory))
+    recommender.close()
+    if server is not None:
+        server.shutdown()
+    book_ids = book_ids[:n_requests]
+
+    recommender = BookRecommender(http=backend)
+    recommender.books.update(catalog)
+    recommender.user_ratings.update(synthetic_user_ratings(catalog, n_users, ratings_per_user))
+    recommender.timer = StageTimer()
+    pairs = [tuple(rng.sample(book_ids, 2)) for _ in range(n_requests)]
+    results.append(measure('book similarity', lambda pair: recommender.calculate_book_similarity(*pair), pairs,
+                           trace_memory=trace_memory))
+    similarity_calls = CallCounter(recommender, 'calculate_book_similarity')
+    users = [rng.randrange(n_users) for _ in range(n_requests)]
+    results.append(measure('book recommendations', recommender.get_recommendations, users,
+                           counters=[similarity_calls], trace_memory=trace_memory))
+    results[-1]['stages'] = recommender.timer.export(reset=True)
+    recommender.enable_approximate(k=neighbors)
+    results.append(measure(f'book top-{neighbors} neighbors',
+                           lambda user: recommender.get_recommendations(user, approximate=True), users,
+                           counters=[similarity_calls], trace_memory=trace_memory))
+    results[-1]['stages'] = recommender.timer.export()
+    return results
+
+
+def print_results(results):
+    for result in results:
+        line = (f"{result['scenario']:<24} n={result['requests']:<5} "
+                f"p50={result['p50_ms']:.3f}ms p90={result['p90_ms']:.3f}ms "
+                f"p99={result['p99_ms']:.3f}ms max={result['max_ms']:.3f}ms")
+        if 'peak_mib' in result:
+            line += f" peak={result['peak_mib']:.1f}MiB"
+        print(line)
+        for key, value in result.items():
+            if key.endswith('_per_request'):
+                print(f"    {key}: {value:.2f}")
+        for stage, stats in result.get('stages', {}).items():
+            print(f"    stage {stage}: {stats['calls']} calls, mean {stats['mean_ms']:.3f}ms, max {stats['max_ms']:.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark both recommenders against offline fake backends")
+    parser.add_argument('--items', type=int, default=10000, help="synthetic movies and books")
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--ratings-per-user', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.0, help="fake backend round trip in seconds")
+    parser.add_argument('--memory', action='store_true', help="trace peak memory (slower)")
+    parser.add_argument('--only', choices=['movies', 'books'])
+    parser.add_argument('--neighbors', type=int, default=50, help="k of the book neighbor table")
+    parser.add_argument('--stub-server', action='store_true', help="serve the fake books API over local HTTP")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    if args.only != 'books':
+        results += movie_scenarios(args.items, args.users, args.ratings_per_user, args.requests,
+                                   args.latency, args.memory)
+    if args.only != 'movies':
+        results += book_scenarios(args.items, args.users, args.ratings_per_user, args.requests,
+                                  args.latency, args.memory, args.stub_server, args.neighbors)
+    print_results(results)
+    try:
+        import resource
+    except ImportError:  # Windows
+        pass
+    else:
+        print(f"max RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,115 @@
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
-import requests
+import os
+import threading
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from book_catalog import BookCatalog
+from book_neighbors import BookNeighbors
+from books_http import GOOGLE_BOOKS_URL, make_session
+from collaborative import MatrixFactorization
+from profiling import timed
+from rating_store import RatingStore
 
 class BookRecommender:
-    def __init__(self):
+    def __init__(self, http=None, base_url=GOOGLE_BOOKS_URL, max_concurrent_fetches=5, store=None):
+        # HTTP client for Google Books (anything with a requests-style get);
+        # by default a pooled keep-alive session with timeouts and retries
+        self.http = http if http is not None else make_session(pool_size=max_concurrent_fetches)
+        self.base_url = base_url.rstrip('/')
+        
+        # Bounded pool for bulk prefetches
+        self.max_concurrent_fetches = max_concurrent_fetches
+        self._fetch_pool = None
+        self._fetch_lock = threading.Lock()
+        
         # Store book data
-        self.books = {}  # Book ID -> book object
-        self.user_ratings = defaultdict(dict)  # user_id -> {book_id -> rating}
+        self.books = BookCatalog()  # Book ID -> book object, indexed by category and author
+        # Optional RatingStore persisting ratings across restarts; it stands in for the dict
+        self.store = store
+        self.user_ratings = store if store is not None else defaultdict(dict)  # user_id -> {book_id -> rating}
+        self.neighbor_table = None  # Optional BookNeighbors for approximate mode
+        self.neighbor_table_path = None
+        
+        # Optional collaborative-filtering model trained on user_ratings
+        self.collaborative = None
+        
+        # Optional profiling.StageTimer recording fetch/similarity/ranking timings
+        self.timer = None
+        
+    @staticmethod
+    def parse_volume(book_data):
+        """Book details from a Google Books volume resource"""
+        volume_info = book_data.get('volumeInfo', {})
+        return {
+            'title': volume_info.get('title', ''),
+            'authors': volume_info.get('authors', []),
+            'year': volume_info.get('publishedDate', '').split('-')[0],
+            'genres': volume_info.get('categories', []),
+            'rating': volume_info.get('averageRating', 0.0)
+        }
         
     def fetch_book_details(self, book_id):
         """Fetch book details using a book API"""
         if book_id not in self.books:
-            # Example API call (replace with a real book API endpoint and API key)
-            url = f"https://www.googleapis.com/books/v1/volumes/{book_id}"
-            response = requests.get(url)
-            book_data = response.json()
+            with timed(self.timer, 'fetch'):
+                response = self.http.get(f"{self.base_url}/volumes/{book_id}")
+                response.raise_for_status()
+                book_data = response.json()
             
-            self.books[book_id] = {
-                'title': book_data.get('volumeInfo', {}).get('title', ''),
-                'authors': book_data.get('volumeInfo', {}).get('authors', []),
-                'year': book_data.get('volumeInfo', {}).get('publishedDate', '').split('-')[0],
-                'genres': book_data.get('volumeInfo', {}).get('categories', []),
-                'rating': book_data.get('volumeInfo', {}).get('averageRating', 0.0)
-            }
+            details = self.parse_volume(book_data)
+            with self._fetch_lock:
+                self.books.setdefault(book_id, details)
         return self.books[book_id]
 
+    def fetch_many(self, book_ids):
+        """Prefetch details for many books concurrently, returning {book_id: details}"""
+        missing = [book_id for book_id in dict.fromkeys(book_ids) if book_id not in self.books]
+        if len(missing) > 1:
+            with self._fetch_lock:
+                if self._fetch_pool is None:
+                    self._fetch_pool = ThreadPoolExecutor(max_workers=self.max_concurrent_fetches)
+            # Results are discarded; list() waits for them and re-raises the first error
+            list(self._fetch_pool.map(self.fetch_book_details, missing))
+        else:
+            for book_id in missing:
+                self.fetch_book_details(book_id)
+        return {book_id: self.books[book_id] for book_id in dict.fromkeys(book_ids)}
+
+    def frozen_catalog(self):
+        """Context manager keeping fetched details out of the catalog while held, e.g. to snapshot it"""
+        return self._fetch_lock
+
+    def close(self):
+        """Shut down the fetch pool, save the neighbor table, close the rating store and pooled connections"""
+        if self._fetch_pool is not None:
+            self._fetch_pool.shutdown()
+            self._fetch_pool = None
+        if self.neighbor_table_path is not None:
+            self.save_neighbors()
+        if self.store is not None:
+            self.store.maybe_compact()
+            self.store.close()
+        if hasattr(self.http, 'close'):
+            self.http.close()
+
     def search_book(self, title):
         """Search for a book by title"""
-        url = "https://www.googleapis.com/books/v1/volumes"
         params = {"q": title, "maxResults": 5}
-        response = requests.get(url, params=params)
-        books = response.json().get('items', [])
+        with timed(self.timer, 'fetch'):
+            response = self.http.get(f"{self.base_url}/volumes", params=params)
+            response.raise_for_status()
+            books = response.json().get('items', [])
         
+        # Each hit already carries its volumeInfo, so no per-result detail request
         results = []
         for book in books:
             book_id = book.get('id')
-            details = self.fetch_book_details(book_id)
+            if book_id is None:
+                continue
+            if book_id not in self.books:
+                self.books[book_id] = self.parse_volume(book)
+            details = self.books[book_id]
             results.append({
                 'id': book_id,
                 'title': details['title'],
@@ -52,6 +125,12 @@ class BookRecommender:
             
         self.fetch_book_details(book_id)
         self.user_ratings[user_id][book_id] = rating
+        if self.store is not None:
+            self.store.log(user_id, book_id, rating)
+        
+        # Keep the user's collaborative vector current without retraining
+        if self.collaborative is not None:
+            self.collaborative.fold_in(user_id, self.user_ratings[user_id])
 
     def calculate_book_similarity(self, book_id1, book_id2):
         """Calculate similarity between two books based on features"""
@@ -71,20 +150,67 @@ class BookRecommender:
         # Weighted similarity
         return 0.7 * genre_sim + 0.3 * author_sim
 
-    def get_recommendations(self, user_id, n_recommendations=5):
+    def enable_approximate(self, k=50, path=None):
+        """Use top-k neighbor lists for get_recommendations(approximate=True), kept in path if given
+
+        A saved table brings back the details of its books, so a fresh
+        process need not fetch them again; one saved with another k is rebuilt.
+        """
+        table = BookNeighbors.load(path) if path is not None and os.path.exists(path) else None
+        if table is not None and table.k == k:
+            with self._fetch_lock:
+                for book_id, details in table.saved_books.items():
+                    if book_id not in self.books:
+                        self.books[book_id] = details
+            table.saved_books = {}
+            table.sync(self.books)
+            self.neighbor_table = table
+        else:
+            self.neighbor_table = BookNeighbors(k).build(self.books)
+        self.neighbor_table_path = path
+        if path is not None:
+            self.save_neighbors()
+
+    def save_neighbors(self):
+        """Write the neighbor table, with every book added since it was loaded, to its path"""
+        self.neighbor_table.sync(self.books)
+        self.neighbor_table.save(self.neighbor_table_path, self.books)
+
+    def get_recommendations(self, user_id, n_recommendations=5, approximate=False):
         """Get book recommendations for a user"""
         if user_id not in self.user_ratings:
             raise ValueError("User not found")
+        if approximate and self.neighbor_table is None:
+            raise ValueError("Approximate mode is not enabled")
+        
+        # Ratings restored from a store may name books this process hasn't fetched yet
+        missing = [book_id for book_id in self.user_ratings[user_id] if book_id not in self.books]
+        if missing:
+            self.fetch_many(missing)
+        if approximate:
+            return self._neighbor_recommendations(user_id, n_recommendations)
         
         rated_books = set(self.user_ratings[user_id].keys())
+        rated = list(self.user_ratings[user_id].items())
         recommendations = []
         
-        for book_id in self.books:
-            if book_id not in rated_books:
+        with timed(self.timer, 'similarity'):
+            # Books sharing no category or author with a rated book score 0 against it,
+            # so only score unrated neighbors of rated books, and only against the rated
+            # books they overlap with (kept in rating order so the sums come out the same)
+            overlapping = defaultdict(list)  # book_id -> indexes into rated
+            for i, (rated_book_id, rating) in enumerate(rated):
+                for book_id in self.books.neighbors(rated_book_id):
+                    if book_id not in rated_books:
+                        overlapping[book_id].append(i)
+            
+            # Catalog order, so books with equal scores rank as they always have
+            for book_id in sorted(overlapping, key=self.books.position):
                 similarity_scores = []
                 weighted_ratings = []
                 
-                for rated_book_id, rating in self.user_ratings[user_id].items():
+                for i in overlapping[book_id]:
+                    rated_book_id, rating = rated[i]
                     similarity = self.calculate_book_similarity(book_id, rated_book_id)
                     if similarity > 0:
                         similarity_scores.append(similarity)
@@ -99,11 +225,68 @@ class BookRecommender:
                         self.books[book_id]['year']
                     ))
         
-        recommendations.sort(key=lambda x: x[1], reverse=True)
+        with timed(self.timer, 'ranking'):
+            recommendations.sort(key=lambda x: x[1], reverse=True)
         return recommendations[:n_recommendations]
 
+    def _neighbor_recommendations(self, user_id, n_recommendations):
+        """Aggregate the rated books' neighbor lists instead of scoring the catalog"""
+        rated_books = set(self.user_ratings[user_id].keys())
+        similarity_sums = defaultdict(float)
+        weighted_sums = defaultdict(float)
+        
+        with timed(self.timer, 'similarity'):
+            self.neighbor_table.sync(self.books)
+            # O(rated x k); same sums as exact scoring whenever k covers every overlapping book
+            for rated_book_id, rating in self.user_ratings[user_id].items():
+                for book_id, similarity in self.neighbor_table.neighbors(rated_book_id):
+                    # Tables saved without book details may list books this process hasn't loaded
+                    if book_id not in rated_books and book_id in self.books:
+                        similarity_sums[book_id] += similarity
+                        weighted_sums[book_id] += rating * similarity
+            
+            recommendations = []
+            for book_id in sorted(similarity_sums, key=self.books.position):
+                recommendations.append((
+                    book_id,
+                    weighted_sums[book_id] / similarity_sums[book_id],
+                    self.books[book_id]['title'],
+                    self.books[book_id]['year']
+                ))
+        
+        with timed(self.timer, 'ranking'):
+            recommendations.sort(key=lambda x: x[1], reverse=True)
+        return recommendations[:n_recommendations]
+
+    def train_collaborative(self, warm_start=True, **params):
+        """Train matrix factorization on all ratings, starting from the last model if any"""
+        if self.collaborative is None or not warm_start:
+            self.collaborative = MatrixFactorization(**params).fit(self.user_ratings)
+        else:
+            self.collaborative.fit(self.user_ratings, warm_start=True)
+        return self.collaborative
+
+    def get_collaborative_recommendations(self, user_id, n_recommendations=5):
+        """Get book recommendations for a user from the collaborative model"""
+        if user_id not in self.user_ratings:
+            raise ValueError("User not found")
+        if self.collaborative is None:
+            raise ValueError("Collaborative model is not trained")
+        
+        predicted = self.collaborative.recommend(user_id, n_recommendations, self.user_ratings[user_id])
+        # The model also knows books that only appear in ratings restored from a store
+        missing = [book_id for book_id, _ in predicted if book_id not in self.books]
+        if missing:
+            self.fetch_many(missing)
+        
+        recommendations = []
+        for book_id, rating in predicted:
+            recommendations.append((book_id, rating, self.books[book_id]['title'], self.books[book_id]['year']))
+        return recommendations
+
 def main():
-    recommender = BookRecommender()
+    # Ratings persist in book_ratings/ between runs
+    recommender = BookRecommender(store=RatingStore('book_ratings'))
     
     while True:
         print("\n1. Search for a book")
@@ -158,6 +341,8 @@ def main():
             
         else:
             print("Invalid choice. Please try again.")
+    
+    recommender.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,94 @@
+from collections import defaultdict
+from collections.abc import MutableMapping
+
+BOOK_FEATURE_KEYS = ('genres', 'authors')
+
+# Most recent changes kept for incremental consumers; ones further behind rescan the catalog
+CHANGE_LOG_SIZE = 100000
+
+
+class BookCatalog(MutableMapping):
+    """Book ID -> details dict, plus an inverted index from each category and author to its books
+
+    The index is updated whenever a book is assigned or removed, so edit a
+    book by assigning a new dict rather than changing the stored one.
+    Iteration follows insertion order, like a plain dict.
+    """
+
+    def __init__(self, books=None):
+        self._books = {}
+        self._positions = {}  # book ID -> insertion counter, increasing in iteration order
+        self._next_position = 0
+        self.postings = {key: defaultdict(set) for key in BOOK_FEATURE_KEYS}  # key -> name -> book IDs
+        self.version = 0  # Books assigned or removed so far
+        self._changes = []  # IDs of the most recent of those books, oldest first
+        self._changes_start = 0  # Version before the first of _changes
+        if books is not None:
+            self.update(books)
+
+    def __getitem__(self, book_id):
+        return self._books[book_id]
+
+    def __contains__(self, book_id):
+        return book_id in self._books
+
+    def __iter__(self):
+        return iter(self._books)
+
+    def __len__(self):
+        return len(self._books)
+
+    def __setitem__(self, book_id, details):
+        if book_id in self._books:
+            self._unindex(book_id)
+        else:
+            self._positions[book_id] = self._next_position
+            self._next_position += 1
+        self._books[book_id] = details
+        self._changed(book_id)
+        for key in BOOK_FEATURE_KEYS:
+            for name in set(details.get(key, [])):
+                self.postings[key][name].add(book_id)
+
+    def __delitem__(self, book_id):
+        self._unindex(book_id)
+        del self._books[book_id]
+        del self._positions[book_id]
+        self._changed(book_id)
+
+    def _changed(self, book_id):
+        self.version += 1
+        self._changes.append(book_id)
+        if len(self._changes) > CHANGE_LOG_SIZE:
+            # Drop the older half at once, so trimming stays cheap per change
+            dropped = len(self._changes) // 2
+            del self._changes[:dropped]
+            self._changes_start += dropped
+
+    def changes_since(self, version):
+        """IDs of books assigned or removed after the given version, or None if no longer logged"""
+        if version < self._changes_start:
+            return None
+        return self._changes[version - self._changes_start:]
+
+    def _unindex(self, book_id):
+        for key in BOOK_FEATURE_KEYS:
+            postings = self.postings[key]
+            for name in set(self._books[book_id].get(key, [])):
+                postings[name].discard(book_id)
+                if not postings[name]:
+                    del postings[name]
+
+    def position(self, book_id):
+        """Sort key putting books in iteration order"""
+        return self._positions[book_id]
+
+    def neighbors(self, book_id):
+        """Books sharing at least one category or author with the given book, itself included"""
+        details = self._books[book_id]
+        neighbors = set()
+        for key in BOOK_FEATURE_KEYS:
+            postings = self.postings[key]
+            for name in set(details.get(key, [])):
+                neighbors.update(postings[name])
+        return neighbors
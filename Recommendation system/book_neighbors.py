@@ -0,0 +1,247 @@
+import bisect
+import json
+import zlib
+
+import numpy as np
+from scipy import sparse
+
+from book_catalog import BOOK_FEATURE_KEYS
+from feature_scoring import MovieFeatureMatrices
+
+# Weight of genre and author Jaccard similarity, as in BookRecommender.calculate_book_similarity
+WEIGHTS = {'genres': 0.7, 'authors': 0.3}
+
+# Books scored per sparse product while building the table
+BUILD_BLOCK_SIZE = 512
+
+
+def book_similarity(book1, book2):
+    """Same score as BookRecommender.calculate_book_similarity, on two details dicts"""
+    similarity = 0.0
+    for key in BOOK_FEATURE_KEYS:
+        names1 = set(book1.get(key, []))
+        names2 = set(book2.get(key, []))
+        if names1 or names2:
+            similarity += WEIGHTS[key] * (len(names1 & names2) / len(names1 | names2))
+    return similarity
+
+
+def fingerprint(details):
+    """Checksum of the features a book's neighbors depend on"""
+    features = '\x1e'.join('\x1f'.join(sorted(set(details.get(key, [])))) for key in BOOK_FEATURE_KEYS)
+    return zlib.crc32(features.encode('utf-8'))
+
+
+def feature_matrix(books, key):
+    """Sparse binary books x names matrix of one attribute"""
+    names = {}
+    indptr, indices = [0], []
+    for details in books:
+        # Sorted, unique columns per row: the canonical CSR format shared_features assumes
+        indices.extend(sorted({names.setdefault(name, len(names)) for name in details.get(key, [])}))
+        indptr.append(len(indices))
+    return sparse.csr_matrix(
+        (np.ones(len(indices)), indices, indptr),
+        shape=(len(books), max(len(names), 1))
+    )
+
+
+class BookFeatureMatrices(MovieFeatureMatrices):
+    """Sparse binary genre/author matrices for a snapshot of a book catalog
+
+    Scores pairs exactly like calculate_book_similarity, so the movie scoring
+    code (predicted_ratings, best_predictions, shared memory publishing)
+    works on books unchanged.
+    """
+    weights = tuple(WEIGHTS[key] for key in BOOK_FEATURE_KEYS)
+
+    def __init__(self, matrices, book_ids=(), version=0):
+        super().__init__(matrices, replacements=version)
+        self.book_ids = list(book_ids)  # row -> book ID
+        self.rows = {book_id: row for row, book_id in enumerate(self.book_ids)}
+
+    @classmethod
+    def from_books(cls, books):
+        """Matrices of every book in a BookCatalog, tagged with its version"""
+        book_ids = list(books)
+        details = [books[book_id] for book_id in book_ids]
+        matrices = [feature_matrix(details, key) for key in BOOK_FEATURE_KEYS]
+        return cls(matrices, book_ids, books.version)
+
+    def rated_rows(self, book_ids):
+        """Row indices of the given books"""
+        return np.array([self.rows[book_id] for book_id in book_ids], dtype=np.int64)
+
+    def movie_id(self, row):
+        """Book ID in a row (named for the scoring code shared with movies)"""
+        return self.book_ids[row]
+
+
+class BookNeighbors:
+    """Top-k most similar books of every book, kept in sync with a BookCatalog
+
+    Lists hold (-similarity, seq, book_id) tuples, best first; seq is the
+    order books joined the table and breaks ties. A larger k gives results
+    closer to exact scoring at the cost of memory and update time.
+    """
+
+    def __init__(self, k=50):
+        self.k = k
+        self.lists = {}  # book ID -> neighbor list
+        self.seqs = {}  # book ID -> seq
+        self.fingerprints = {}  # book ID -> fingerprint of the features its list was built from
+        self._next_seq = 0
+        self._catalog = None  # BookCatalog being followed
+        self._version = 0  # Its version when last synced
+        self.saved_books = {}  # Book ID -> details stored with a loaded table, for restoring the catalog
+
+    def _join(self, book_id, details):
+        self.seqs[book_id] = self._next_seq
+        self._next_seq += 1
+        self.fingerprints[book_id] = fingerprint(details)
+
+    def build(self, catalog):
+        """Replace the table with one computed from the whole catalog in blocked sparse products"""
+        self.lists, self.seqs, self.fingerprints, self._next_seq = {}, {}, {}, 0
+        book_ids = list(catalog)
+        books = [catalog[book_id] for book_id in book_ids]
+        for book_id, details in zip(book_ids, books):
+            self._join(book_id, details)
+        matrices = [feature_matrix(books, key) for key in BOOK_FEATURE_KEYS]
+        sizes = [np.diff(matrix.indptr) for matrix in matrices]
+        transposed = [matrix.T.tocsr() for matrix in matrices]
+        for start in range(0, len(books), BUILD_BLOCK_SIZE):
+            stop = min(start + BUILD_BLOCK_SIZE, len(books))
+            similarity = None
+            for key, matrix, matrix_t, size in zip(BOOK_FEATURE_KEYS, matrices, transposed, sizes):
+                # Jaccard of every pair sharing a name: |a & b| / (|a| + |b| - |a & b|)
+                shared = (matrix[start:stop] @ matrix_t).tocoo()
+                union = size[shared.row + start] + size[shared.col] - shared.data
+                jaccard = sparse.csr_matrix((WEIGHTS[key] * (shared.data / union), (shared.row, shared.col)),
+                                            shape=shared.shape)
+                similarity = jaccard if similarity is None else similarity + jaccard
+            for row in range(stop - start):
+                begin, end = similarity.indptr[row], similarity.indptr[row + 1]
+                columns = similarity.indices[begin:end]
+                scores = similarity.data[begin:end]
+                # Best first, earlier books first among equals, without the book itself
+                best = [i for i in np.lexsort((columns, -scores)).tolist() if columns[i] != start + row]
+                self.lists[book_ids[start + row]] = [(-float(scores[i]), int(columns[i]), book_ids[columns[i]])
+                                                     for i in best[:self.k]]
+        self._catalog, self._version = catalog, catalog.version
+        return self
+
+    def _list(self, book_id, catalog):
+        """Neighbor list of one book recomputed against the books in the table"""
+        details = catalog[book_id]
+        entries = []
+        for other in catalog.neighbors(book_id):
+            if other != book_id and other in self.lists:
+                entries.append((-book_similarity(details, catalog[other]), self.seqs[other], other))
+        entries.sort()
+        return entries[:self.k]
+
+    def sync(self, catalog):
+        """Apply books added, replaced or removed since the last sync"""
+        changes = catalog.changes_since(self._version) if self._catalog is catalog else None
+        if changes is None:
+            # A different catalog, a table loaded from disk, or one synced too long ago: compare every book
+            changed = dict.fromkeys(catalog)
+            if self._catalog is catalog:
+                # Books missing from the catalog followed all along were removed from it
+                changed.update(dict.fromkeys(book_id for book_id in self.seqs if book_id not in catalog))
+            # Otherwise they may just not be loaded yet, so their entries stay
+        else:
+            changed = dict.fromkeys(changes)
+        self._catalog, self._version = catalog, catalog.version
+
+        gone = {book_id for book_id in changed if book_id in self.seqs and
+                (book_id not in catalog or fingerprint(catalog[book_id]) != self.fingerprints[book_id])}
+        added = [book_id for book_id in changed if book_id in catalog and
+                 (book_id not in self.seqs or book_id in gone)]
+        if gone:
+            self._remove(gone, catalog)
+        for book_id in added:
+            self._join(book_id, catalog[book_id])
+        for book_id in added:
+            self._add(book_id, catalog)
+        return len(gone) + len(added)
+
+    def _remove(self, book_ids, catalog):
+        # Rare (books seldom change), so scan every list rather than keep reverse links
+        for book_id in book_ids:
+            del self.lists[book_id], self.seqs[book_id], self.fingerprints[book_id]
+        for book_id, entries in self.lists.items():
+            if any(entry[2] in book_ids for entry in entries):
+                # A dropped entry may have kept a true neighbor out, so recompute the whole list
+                kept = [entry for entry in entries if entry[2] not in book_ids]
+                # Books not loaded into the catalog can't be rescored, so they just lose the entry
+                full = len(entries) == self.k and book_id in catalog
+                self.lists[book_id] = self._list(book_id, catalog) if full else kept
+
+    def _add(self, book_id, catalog):
+        # Only books sharing a genre or author with the new book can score it above 0
+        details = catalog[book_id]
+        seq = self.seqs[book_id]
+        entries = []
+        for other in catalog.neighbors(book_id):
+            other_entries = self.lists.get(other)
+            if other == book_id or other_entries is None:
+                continue  # Books added later in this sync score against this one themselves
+            neg_similarity = -book_similarity(details, catalog[other])
+            entries.append((neg_similarity, self.seqs[other], other))
+            entry = (neg_similarity, seq, book_id)
+            if len(other_entries) < self.k or entry < other_entries[-1]:
+                bisect.insort(other_entries, entry)
+                del other_entries[self.k:]
+        entries.sort()
+        self.lists[book_id] = entries[:self.k]
+
+    def neighbors(self, book_id):
+        """(book_id, similarity) pairs of a book's nearest neighbors, best first"""
+        return [(other, -neg_similarity) for neg_similarity, _, other in self.lists.get(book_id, ())]
+
+    def save(self, path, catalog=None):
+        """Write the table in .npz format to exactly path (np.savez would append .npz to a name)
+
+        With a catalog, the details of the table's books are stored too, so
+        load can restore them into a catalog that hasn't fetched them.
+        """
+        book_ids = list(self.seqs)
+        index = {book_id: i for i, book_id in enumerate(book_ids)}
+        offsets = np.zeros(len(book_ids) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(self.lists[book_id]) for book_id in book_ids])
+        entries = [entry for book_id in book_ids for entry in self.lists[book_id]]
+        books = {} if catalog is None else {book_id: catalog[book_id] for book_id in book_ids if book_id in catalog}
+        with open(path, 'wb') as f:
+            np.savez(
+                f,
+                k=self.k,
+                books=np.array(json.dumps(books)),
+                book_ids=np.array(book_ids, dtype=str),
+                seqs=np.array([self.seqs[book_id] for book_id in book_ids], dtype=np.int64),
+                fingerprints=np.array([self.fingerprints[book_id] for book_id in book_ids], dtype=np.uint32),
+                offsets=offsets,
+                neighbors=np.array([index[entry[2]] for entry in entries], dtype=np.int64),
+                similarities=np.array([-entry[0] for entry in entries], dtype=np.float64)
+            )
+
+    @classmethod
+    def load(cls, path):
+        """Read a table written by save, with any stored book details in saved_books; sync it before use"""
+        with np.load(path) as data:
+            table = cls(int(data['k']))
+            book_ids = data['book_ids'].tolist()
+            seqs = data['seqs'].tolist()
+            offsets = data['offsets'].tolist()
+            neighbors = data['neighbors'].tolist()
+            similarities = data['similarities'].tolist()
+            table.seqs = dict(zip(book_ids, seqs))
+            table.fingerprints = dict(zip(book_ids, data['fingerprints'].tolist()))
+            if 'books' in data.files:
+                table.saved_books = json.loads(str(data['books']))
+        table._next_seq = max(seqs, default=-1) + 1
+        for i, book_id in enumerate(book_ids):
+            table.lists[book_id] = [(-similarities[j], seqs[neighbors[j]], book_ids[neighbors[j]])
+                                    for j in range(offsets[i], offsets[i + 1])]
+        return table
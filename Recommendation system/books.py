@@ -0,0 +1,12 @@
+import importlib.util
+import os
+import sys
+
+# "book url.py" can't be imported by name, so load it once under an importable one
+_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'book url.py')
+_spec = importlib.util.spec_from_file_location('book_url', _path)
+book_url = sys.modules.setdefault('book_url', importlib.util.module_from_spec(_spec))
+if not hasattr(book_url, 'BookRecommender'):
+    _spec.loader.exec_module(book_url)
+
+BookRecommender = book_url.BookRecommender
@@ -0,0 +1,41 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+GOOGLE_BOOKS_URL = "https://www.googleapis.com/books/v1"
+
+# (connect, read) seconds; requests waits forever without one
+DEFAULT_TIMEOUT = (3.05, 10)
+
+
+class TimeoutSession(requests.Session):
+    """requests.Session that applies a default timeout to every request"""
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def make_session(timeout=DEFAULT_TIMEOUT, retries=3, backoff_factor=0.5, pool_size=10):
+    """Keep-alive session with pooled connections and bounded retries with exponential backoff
+
+    Connection errors and 429/5xx answers to GETs are retried up to retries
+    times, sleeping backoff_factor * 2 ** n seconds between tries (or what
+    a Retry-After header asks for).
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({'GET'}),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = TimeoutSession(timeout)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
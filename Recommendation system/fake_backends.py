@@ -0,0 +1,175 @@
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+
+class FakeMovie(dict):
+    """IMDb movie object: dict-style fields plus getID()"""
+
+    def __init__(self, movie_id, **fields):
+        super().__init__(**fields)
+        self.movie_id = movie_id
+
+    def getID(self):
+        return self.movie_id
+
+
+def _title_index(items):
+    index = defaultdict(list)
+    for item_id, details in items.items():
+        for word in set(details['title'].lower().split()):
+            index[word].append(item_id)
+    return index
+
+
+def _search(index, query, limit):
+    # Items whose title contains every word of the query, in catalog order
+    words = query.lower().split()
+    if not words:
+        return []
+    matches = set(index.get(words[0], ()))
+    for word in words[1:]:
+        matches.intersection_update(index.get(word, ()))
+    return [item_id for item_id in index.get(words[0], ()) if item_id in matches][:limit]
+
+
+class FakeIMDb:
+    """Offline stand-in for imdb.IMDb() serving a catalog in the recommender's shape"""
+
+    def __init__(self, movies, latency=0.0):
+        self.movies = movies  # IMDb ID -> details as fetch_movie_details returns them
+        self.latency = latency  # Seconds added to every call, to mimic a round trip
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._index = None
+
+    def _call(self, name):
+        with self._lock:
+            self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get_movie(self, movie_id):
+        self._call('get_movie')
+        details = self.movies[movie_id]
+        return FakeMovie(
+            movie_id,
+            title=details['title'],
+            year=details['year'],
+            genres=list(details['genres']),
+            directors=[{'name': name} for name in details['director']],
+            cast=[{'name': name} for name in details['cast']],
+            rating=details['rating']
+        )
+
+    def search_movie(self, title):
+        self._call('search_movie')
+        if self._index is None:
+            self._index = _title_index(self.movies)
+        return [FakeMovie(movie_id, title=self.movies[movie_id]['title'])
+                for movie_id in _search(self._index, title, 20)]
+
+
+class FakeResponse:
+    """The parts of requests.Response the recommenders use"""
+
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+
+    def json(self):
+        return self.payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class FakeGoogleBooks:
+    """Offline stand-in for the Google Books volumes API with a requests-style get()"""
+
+    def __init__(self, books, latency=0.0):
+        self.books = books  # volume ID -> details as fetch_book_details returns them
+        self.latency = latency
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._index = None
+
+    def volume(self, book_id):
+        details = self.books[book_id]
+        return {
+            'id': book_id,
+            'volumeInfo': {
+                'title': details['title'],
+                'authors': list(details['authors']),
+                'publishedDate': details['year'],
+                'categories': list(details['genres']),
+                'averageRating': details['rating'],
+            }
+        }
+
+    def get(self, url, params=None, **kwargs):
+        with self._lock:
+            self.calls['get'] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        path = urlparse(url).path.rstrip('/')
+        if path.endswith('/volumes'):
+            if self._index is None:
+                self._index = _title_index(self.books)
+            params = params or {}
+            matches = _search(self._index, params.get('q', ''), int(params.get('maxResults', 10)))
+            return FakeResponse({'items': [self.volume(book_id) for book_id in matches]})
+        book_id = path.rsplit('/', 1)[-1]
+        if book_id not in self.books:
+            return FakeResponse({'error': {'code': 404, 'message': 'The volume ID could not be found.'}}, 404)
+        return FakeResponse(self.volume(book_id))
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep connections alive like the real API
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        backend = self.server.backend
+        failures = self.server.failures
+        with self.server.lock:
+            self.server.connections.add(self.client_address)
+            fail = failures and failures.pop(0)
+        if fail:
+            response = FakeResponse({'error': {'code': fail}}, fail)
+        else:
+            url = urlparse(self.path)
+            response = backend.get(url.path, params=dict(parse_qsl(url.query)))
+        body = json.dumps(response.payload).encode('utf-8')
+        self.send_response(response.status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_fake_books(books, latency=0.0, failures=()):
+    """Serve FakeGoogleBooks over real HTTP on a free localhost port, in a daemon thread
+
+    Returns (server, base_url); pass base_url to BookRecommender and call
+    server.shutdown() when done. failures lists status codes to answer the
+    first requests with, e.g. (503, 503) to exercise retries; the server
+    also records server.connections, the distinct client (host, port)
+    pairs it has seen, to show connection reuse.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+    server.daemon_threads = True
+    server.backend = FakeGoogleBooks(books, latency=latency)
+    server.failures = list(failures)
+    server.lock = threading.Lock()
+    server.connections = set()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}/books/v1"
@@ -0,0 +1,110 @@
+import numpy as np
+from scipy import sparse
+
+from movie_catalog import FEATURE_KEYS, MovieCatalog
+
+# Rated movies scored per sparse product; bounds the size of the similarity block
+SIMILARITY_BLOCK_SIZE = 64
+
+
+class MovieFeatureMatrices:
+    """Sparse binary genre/director/cast matrices for a snapshot of the catalog"""
+    weights = (0.5, 0.3, 0.2)
+
+    def __init__(self, matrices, catalog=None, replacements=0):
+        self.matrices = matrices
+        self.replacements = replacements  # MovieCatalog.replacements when the matrices were built
+        self.sizes = [np.diff(matrix.indptr).astype(np.float64) for matrix in matrices]
+        # Maps IMDb IDs to rows; worker processes scoring by row go without it
+        self.catalog = catalog
+
+    @classmethod
+    def from_movies(cls, movies):
+        """Encode every movie's genres, directors and cast as binary matrix rows"""
+        if not isinstance(movies, MovieCatalog):
+            movies = MovieCatalog(movies)
+        # Every attribute at one moment, while fetch threads may be adding movies
+        with movies.lock:
+            arrays = {key: movies.csr_arrays(key) for key in FEATURE_KEYS}
+            shape = (len(movies), len(movies.names))
+            replacements = movies.replacements
+        matrices = []
+        # Interned name IDs already are the column indices
+        for key in FEATURE_KEYS:
+            indptr, indices = arrays[key]
+            matrix = sparse.csr_matrix((np.ones(len(indices)), indices, indptr), shape=shape)
+            # A name listed twice for one movie still counts once, as in a set
+            matrix.sum_duplicates()
+            matrix.data[:] = 1.0
+            matrices.append(matrix)
+        return cls(matrices, movies, replacements)
+
+    def __len__(self):
+        return self.matrices[0].shape[0]
+
+    def rated_rows(self, movie_ids):
+        """Row indices of the given movies"""
+        return np.array([self.catalog.row(movie_id) for movie_id in movie_ids], dtype=np.int64)
+
+    def movie_id(self, row):
+        """IMDb ID of the movie in a row"""
+        return self.catalog.movie_id(row)
+
+    def similarity_block(self, rated_rows, rows=None):
+        """Weighted Jaccard similarity of movies (all, or the given rows) to each rated row, as a CSC matrix"""
+        total = None
+        for weight, matrix, sizes in zip(self.weights, self.matrices, self.sizes):
+            if rows is not None:
+                matrix_rows, row_sizes = matrix[rows], sizes[rows]
+            else:
+                matrix_rows, row_sizes = matrix, sizes
+            # Intersection sizes for every (movie, rated movie) pair sharing a feature
+            intersection = (matrix_rows @ matrix[rated_rows].T).tocoo()
+            union = row_sizes[intersection.row] + sizes[rated_rows][intersection.col] - intersection.data
+            jaccard = sparse.csr_matrix(
+                (intersection.data / union, (intersection.row, intersection.col)),
+                shape=intersection.shape
+            )
+            # Same evaluation order as calculate_movie_similarity, so the floats match
+            total = weight * jaccard if total is None else total + weight * jaccard
+        total = total.tocsc()
+        total.sum_duplicates()
+        return total
+
+    def predicted_ratings(self, rated_rows, ratings, rows=None):
+        """Accumulate sum(rating * sim) and sum(sim) for every movie (or the given rows), in rating order"""
+        size = len(self) if rows is None else len(rows)
+        weighted = np.zeros(size)
+        similarity = np.zeros(size)
+        for start in range(0, len(rated_rows), SIMILARITY_BLOCK_SIZE):
+            block = self.similarity_block(rated_rows[start:start + SIMILARITY_BLOCK_SIZE], rows)
+            for j, rating in enumerate(ratings[start:start + SIMILARITY_BLOCK_SIZE]):
+                block_rows = block.indices[block.indptr[j]:block.indptr[j + 1]]
+                values = block.data[block.indptr[j]:block.indptr[j + 1]]
+                weighted[block_rows] += rating * values
+                similarity[block_rows] += values
+        return weighted, similarity
+
+
+def best_predictions(weighted, similarity, excluded, n):
+    """Positions and predicted ratings of the n best non-excluded entries with any similar rated movie"""
+    candidates = np.flatnonzero((similarity > 0) & ~excluded)
+    scores = np.zeros(len(similarity))
+    scores[candidates] = weighted[candidates] / similarity[candidates]
+    positions = top_n(scores, candidates, n)
+    return positions, scores[positions]
+
+
+def top_n(scores, candidates, n):
+    """Indices of the n best candidates, ties broken by catalog order like a stable sort"""
+    if n <= 0 or len(candidates) == 0:
+        return candidates[:0]
+    candidate_scores = scores[candidates]
+    if len(candidates) > n:
+        # Keep everything tied with the n-th best score so the stable ordering is preserved
+        threshold = np.partition(candidate_scores, len(candidates) - n)[len(candidates) - n]
+        keep = candidate_scores >= threshold
+        candidates = candidates[keep]
+        candidate_scores = candidate_scores[keep]
+    order = np.lexsort((candidates, -candidate_scores))
+    return candidates[order][:n]
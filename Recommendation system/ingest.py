@@ -0,0 +1,231 @@
+import csv
+import json
+import sys
+import time
+from itertools import islice
+
+import numpy as np
+
+# Fields of a catalog row holding lists; in CSV files their values are separated by '|'
+MOVIE_LIST_FIELDS = ('genres', 'director', 'cast')
+BOOK_LIST_FIELDS = ('genres', 'authors')
+LIST_SEPARATOR = '|'
+
+
+def _target(recommender):
+    """(ratings dict, catalog, item ID column, list fields) of either recommender"""
+    if hasattr(recommender, 'movie_ratings'):
+        return recommender.movie_ratings, recommender.movies, 'movie_id', MOVIE_LIST_FIELDS
+    return recommender.user_ratings, recommender.books, 'book_id', BOOK_LIST_FIELDS
+
+
+def read_chunks(path, chunk_size=50000):
+    """Yield lists of at most chunk_size row dicts from a CSV (with a header) or JSON-lines file"""
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith(('.jsonl', '.ndjson', '.json')):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            # csv.DictReader does the same, at about twice the cost per row
+            reader = csv.reader(f)
+            header = next(reader, [])
+            rows = (dict(zip(header, row)) for row in reader if row)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+
+def valid_ratings(values):
+    """Ratings as a float array and a mask of those that are numbers between 1 and 5"""
+    try:
+        ratings = np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        # Some value doesn't parse; fall back to one at a time for this chunk only
+        ratings = np.array([_to_float(value) for value in values], dtype=np.float64)
+    return ratings, (ratings >= 1) & (ratings <= 5)
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class _Progress:
+    """Counters shared by the ingest functions, reported after every chunk"""
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.start = time.perf_counter()
+        self.stats = {'rows': 0, 'loaded': 0, 'rejected': 0, 'fetched': 0, 'fetch_errors': 0}
+
+    def report(self, final=False):
+        elapsed = time.perf_counter() - self.start
+        self.stats['seconds'] = elapsed
+        self.stats['rows_per_sec'] = self.stats['rows'] / elapsed if elapsed else 0.0
+        if self.callback is not None:
+            self.callback(dict(self.stats, done=final))
+        return self.stats
+
+
+def print_progress(stats):
+    """Default progress callback: one line on stderr per chunk"""
+    print(f"{stats['rows']} rows ({stats['loaded']} loaded, {stats['rejected']} rejected, "
+          f"{stats['fetched']} fetched), {stats['rows_per_sec']:.0f} rows/sec", file=sys.stderr)
+
+
+def _fetch(recommender, item_ids, progress):
+    """Fetch missing items in one concurrent batch, retrying one by one if any fails"""
+    try:
+        recommender.fetch_many(item_ids)
+        progress.stats['fetched'] += len(item_ids)
+        return
+    except Exception:
+        pass
+    _, catalog, _, _ = _target(recommender)
+    for item_id in item_ids:
+        if item_id in catalog:
+            progress.stats['fetched'] += 1
+            continue
+        try:
+            recommender.fetch_many([item_id])
+            progress.stats['fetched'] += 1
+        except Exception:
+            progress.stats['fetch_errors'] += 1
+
+
+def ingest_ratings(recommender, path, chunk_size=50000, fetch=True, fetch_batch=1000, progress=print_progress):
+    """Stream user_id,<movie_id|book_id>,rating rows from a CSV or JSON-lines file into a recommender
+
+    Rows are read chunk_size at a time and validated together; rows without
+    a user, an item or a rating between 1 and 5 are counted as rejected.
+    Ratings go straight into the ratings dict (through the RatingStore with
+    one log write per chunk if there is one) instead of add_user_rating, so
+    collaborative models need retraining afterwards. Items missing from the
+    catalog are fetched fetch_batch at a time, each at most once; pass
+    fetch=False when the catalog was loaded beforehand. Memory stays bounded
+    by the chunk and batch sizes plus the ratings themselves.
+
+    progress is called with running stats after every chunk; the final
+    stats are returned.
+    """
+    ratings, catalog, item_column, _ = _target(recommender)
+    store = getattr(recommender, 'store', None)
+    progress = _Progress(progress)
+    pending = {}  # Item IDs waiting to be fetched, in first-seen order
+    attempted = set()  # Items whose fetch failed, so they aren't retried on every row
+    for chunk in read_chunks(path, chunk_size):
+        values, valid = valid_ratings([row.get('rating') for row in chunk])
+        loaded = []
+        for row, rating, ok in zip(chunk, values.tolist(), valid.tolist()):
+            user_id = row.get('user_id')
+            item_id = row.get(item_column, row.get('item_id'))
+            if not ok or user_id in (None, '') or item_id in (None, ''):
+                continue
+            loaded.append((user_id, item_id, rating))
+        if fetch:
+            # Look each distinct item up once per chunk
+            for item_id in dict.fromkeys(item_id for _, item_id, _ in loaded):
+                if item_id not in pending and item_id not in attempted and item_id not in catalog:
+                    pending[item_id] = None
+        if store is not None:
+            store.log_many(loaded)
+            store.maybe_compact()
+        else:
+            for user_id, item_id, rating in loaded:
+                ratings[user_id][item_id] = rating
+        progress.stats['rows'] += len(chunk)
+        progress.stats['loaded'] += len(loaded)
+        progress.stats['rejected'] += len(chunk) - len(loaded)
+
+        while len(pending) >= fetch_batch:
+            batch = list(islice(pending, fetch_batch))
+            for item_id in batch:
+                del pending[item_id]
+            _fetch(recommender, batch, progress)
+            attempted.update(item_id for item_id in batch if item_id not in catalog)
+        progress.report()
+    if pending:
+        _fetch(recommender, list(pending), progress)
+    return progress.report(final=True)
+
+
+def _catalog_details(row, list_fields, int_year):
+    """Catalog details from a JSON row as is, or from a CSV row with '|'-separated lists"""
+    details = {key: value for key, value in row.items() if key not in ('movie_id', 'book_id', 'item_id', 'id')}
+    for key in list_fields:
+        value = details.get(key, [])
+        if isinstance(value, str):
+            details[key] = [name for name in value.split(LIST_SEPARATOR) if name]
+        elif not isinstance(value, list):
+            details[key] = []
+    rating = _to_float(details.get('rating'))
+    details['rating'] = 0.0 if np.isnan(rating) else rating
+    year = details.get('year', '')
+    if int_year and isinstance(year, str) and year.isdigit():
+        details['year'] = int(year)  # IMDb years are ints, Google Books years strings
+    details.setdefault('title', '')
+    details.setdefault('year', '')
+    return details
+
+
+def ingest_catalog(recommender, path, chunk_size=50000, progress=print_progress):
+    """Stream catalog metadata rows (an ID column plus the details fields) into a recommender
+
+    Rows without an ID are rejected; an ID already in the catalog has its
+    details replaced. Loading the catalog first lets ingest_ratings run
+    with fetch=False.
+    """
+    _, catalog, item_column, list_fields = _target(recommender)
+    progress = _Progress(progress)
+    for chunk in read_chunks(path, chunk_size):
+        loaded = 0
+        for row in chunk:
+            item_id = row.get(item_column, row.get('item_id', row.get('id')))
+            if item_id in (None, ''):
+                continue
+            catalog[item_id] = _catalog_details(row, list_fields, item_column == 'movie_id')
+            loaded += 1
+        progress.stats['rows'] += len(chunk)
+        progress.stats['loaded'] += loaded
+        progress.stats['rejected'] += len(chunk) - loaded
+        progress.report()
+    return progress.report(final=True)
+
+
+def main():
+    import argparse
+
+    from Movie import IMDBMovieRecommender
+    from books import BookRecommender
+    from rating_store import RatingStore
+
+    parser = argparse.ArgumentParser(description="Stream ratings and catalog dumps into a recommender")
+    parser.add_argument('kind', choices=['movies', 'books'])
+    parser.add_argument('--catalog', help="CSV or JSON-lines catalog metadata")
+    parser.add_argument('--ratings', help="CSV or JSON-lines ratings")
+    parser.add_argument('--store', help="RatingStore directory to persist the ratings in")
+    parser.add_argument('--chunk-size', type=int, default=50000)
+    parser.add_argument('--fetch-batch', type=int, default=1000)
+    parser.add_argument('--no-fetch', action='store_true', help="don't fetch items missing from the catalog")
+    args = parser.parse_args()
+
+    store = RatingStore(args.store) if args.store else None
+    if args.kind == 'movies':
+        recommender = IMDBMovieRecommender(ia=object() if args.no_fetch else None, store=store)
+    else:
+        recommender = BookRecommender(store=store)
+    if args.catalog:
+        stats = ingest_catalog(recommender, args.catalog, args.chunk_size)
+        print(f"catalog: {stats['loaded']} items in {stats['seconds']:.1f}s ({stats['rows_per_sec']:.0f} rows/sec)")
+    if args.ratings:
+        stats = ingest_ratings(recommender, args.ratings, args.chunk_size, not args.no_fetch, args.fetch_batch)
+        print(f"ratings: {stats['loaded']} loaded, {stats['rejected']} rejected, {stats['fetched']} items fetched "
+              f"in {stats['seconds']:.1f}s ({stats['rows_per_sec']:.0f} rows/sec)")
+    recommender.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import json
+import sqlite3
+import threading
+import time
+
+# Cache hits whose access times are held in memory before being written in one transaction
+TOUCH_BATCH_SIZE = 256
+
+
+class MetadataCache:
+    """Persistent SQLite cache for item metadata with per-entry TTL and LRU eviction
+
+    Hits don't write to the database: their access times are batched and
+    written every TOUCH_BATCH_SIZE hits, before anything is evicted, and on
+    close, so a read-mostly workload commits once per batch, not per get.
+    """
+
+    def __init__(self, path, ttl=7 * 24 * 3600, max_entries=100000, clock=time.time):
+        self.path = path
+        self.ttl = ttl  # Seconds an entry stays fresh, None to never expire
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._touched = {}  # key -> access time not yet written
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "stored_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_access)")
+        self._db.commit()
+        self._size = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def _expired(self, stored_at, now):
+        return self.ttl is not None and now - stored_at > self.ttl
+
+    def get(self, key):
+        """Return the cached value for key, or None if it is missing or expired"""
+        with self._lock:
+            now = self.clock()
+            row = self._db.execute("SELECT value, stored_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or self._expired(row[1], now):
+                if row is not None:
+                    self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    self._db.commit()
+                    self._touched.pop(key, None)
+                    self._size -= 1
+                self.misses += 1
+                return None
+            self._touched[key] = now
+            if len(self._touched) >= TOUCH_BATCH_SIZE:
+                self._write_touches()
+                self._db.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, key, value):
+        """Store value under key, evicting the least recently used entries over the cap"""
+        with self._lock:
+            now = self.clock()
+            # Eviction below must see every hit so far
+            self._write_touches()
+            existed = self._db.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, stored_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now)
+            )
+            if not existed:
+                self._size += 1
+            if self.max_entries is not None and self._size > self.max_entries:
+                overflow = self._size - self.max_entries
+                self._db.execute(
+                    "DELETE FROM entries WHERE key IN "
+                    "(SELECT key FROM entries ORDER BY last_access LIMIT ?)",
+                    (overflow,)
+                )
+                self._size -= overflow
+                self.evictions += overflow
+            self._db.commit()
+
+    def _write_touches(self):
+        if self._touched:
+            self._db.executemany("UPDATE entries SET last_access = ? WHERE key = ?",
+                                 [(now, key) for key, now in self._touched.items()])
+            self._touched.clear()
+
+    def flush(self):
+        """Write the access times of recent hits"""
+        with self._lock:
+            self._write_touches()
+            self._db.commit()
+
+    def items(self):
+        """Yield (key, value) for every fresh entry, without touching LRU order"""
+        with self._lock:
+            now = self.clock()
+            rows = self._db.execute("SELECT key, value, stored_at FROM entries ORDER BY rowid").fetchall()
+        for key, value, stored_at in rows:
+            if not self._expired(stored_at, now):
+                yield key, json.loads(value)
+
+    def __len__(self):
+        return self._size
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': self._size,
+        }
+
+    def close(self):
+        with self._lock:
+            self._write_touches()
+            self._db.commit()
+            self._db.close()
@@ -0,0 +1,265 @@
+import threading
+import zlib
+from array import array
+from collections.abc import MutableMapping
+
+import numpy as np
+
+FEATURE_KEYS = ('genres', 'director', 'cast')
+
+# Empty slot in the ID hash table
+EMPTY = -1
+
+# Movies whose feature ID sets are memoized for repeated similarity calls
+FEATURE_SET_CACHE_SIZE = 4096
+
+# Most recent in-place replacements whose rows are kept for incremental consumers
+REPLACEMENT_LOG_SIZE = 100000
+
+
+class MovieCatalog(MutableMapping):
+    """Columnar movie store: names interned to integer IDs, attributes kept in flat arrays
+
+    Reading a movie returns a fresh dict in the shape fetch_movie_details has
+    always returned, so it behaves like the old dict of dicts; edits to that
+    dict are not written back, assign a new one instead.
+
+    Writers hold lock, and so do readers of titles and features, which move
+    when a movie is overwritten in place; hold it to read several columns
+    at one consistent moment.
+    """
+
+    def __init__(self, movies=None):
+        self.lock = threading.RLock()
+        self.names = []  # name ID -> name, shared by genres, directors and cast
+        self._name_ids = {}  # name -> name ID
+        # IMDb IDs packed back to back, found through an open-addressing table of rows,
+        # instead of a dict holding a string and an int object per movie
+        self._ids = bytearray()
+        self._id_offsets = array('q', [0])
+        self._id_hashes = array('I')
+        self._slots = array('q', [EMPTY]) * 8
+        self._size = 0  # Rows reachable through the table; counted last, once a row is complete
+        self._titles = bytearray()  # UTF-8 titles back to back
+        self._title_offsets = array('q', [0])
+        self._years = array('q')
+        self._odd_years = {}  # row -> year that isn't an int (usually '')
+        self._ratings = array('d')
+        # Per attribute: name IDs of every movie back to back, and where each row starts
+        self._offsets = {key: array('q', [0]) for key in FEATURE_KEYS}
+        self._values = {key: array('i') for key in FEATURE_KEYS}
+        self.replacements = 0  # Movies overwritten in place; rows keep their position
+        self._replaced = []  # Rows of the most recent of those replacements, oldest first
+        self._replaced_start = 0  # Replacements made before the first of _replaced
+        self._feature_set_cache = {}  # IMDb ID -> genre, director and cast ID sets
+        if movies is not None:
+            self.update(movies)
+
+    def intern(self, name):
+        """Integer ID of a genre or person name"""
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            name_id = self._name_ids[name] = len(self.names)
+            self.names.append(name)
+        return name_id
+
+    def _find(self, slots, encoded, digest):
+        """Slot of the table holding the row of an encoded ID, or the empty slot where it belongs
+
+        Callers pass the table they read self._slots into once, so a lookup
+        racing a fetch thread's _grow stays within one consistent table.
+        """
+        mask = len(slots) - 1
+        slot = digest & mask
+        while True:
+            row = slots[slot]
+            if row == EMPTY or (self._id_hashes[row] == digest and
+                                self._ids[self._id_offsets[row]:self._id_offsets[row + 1]] == encoded):
+                return slot
+            slot = (slot + 1) & mask
+
+    def _grow(self):
+        # Keep the table at most half full; the new table is filled before it replaces the old one
+        slots = array('q', [EMPTY]) * (2 * len(self._slots))
+        mask = len(slots) - 1
+        for row, digest in enumerate(self._id_hashes):
+            slot = digest & mask
+            while slots[slot] != EMPTY:
+                slot = (slot + 1) & mask
+            slots[slot] = row
+        self._slots = slots
+
+    def row(self, movie_id):
+        """Row of a movie, raising KeyError if it is not in the catalog"""
+        encoded = movie_id.encode('utf-8')
+        slots = self._slots
+        row = slots[self._find(slots, encoded, zlib.crc32(encoded))]
+        if row == EMPTY:
+            raise KeyError(movie_id)
+        return row
+
+    def movie_id(self, row):
+        """IMDb ID of the movie in the given row"""
+        return self._ids[self._id_offsets[row]:self._id_offsets[row + 1]].decode('utf-8')
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self.movie_id(row)
+
+    def __contains__(self, movie_id):
+        if not isinstance(movie_id, str):
+            return False
+        encoded = movie_id.encode('utf-8')
+        slots = self._slots
+        return slots[self._find(slots, encoded, zlib.crc32(encoded))] != EMPTY
+
+    def __getitem__(self, movie_id):
+        if not isinstance(movie_id, str):
+            raise KeyError(movie_id)
+        with self.lock:
+            row = self.row(movie_id)
+            details = {'title': self.title(row), 'year': self.year(row)}
+            for key in FEATURE_KEYS:
+                details[key] = [self.names[name_id] for name_id in self.feature_ids(row, key)]
+            details['rating'] = self._ratings[row]
+        return details
+
+    def __setitem__(self, movie_id, details):
+        if not isinstance(movie_id, str):
+            raise TypeError("Movie IDs must be strings")
+        # Everything that can fail happens before the first column is touched,
+        # so a bad movie can't leave the columns misaligned
+        title = details.get('title', '').encode('utf-8')
+        year = details.get('year', '')
+        rating = float(details.get('rating', 0.0) or 0.0)
+        encoded = movie_id.encode('utf-8')
+        digest = zlib.crc32(encoded)
+        with self.lock:
+            features = {key: array('i', map(self.intern, details.get(key, []))) for key in FEATURE_KEYS}
+            self._store(encoded, digest, title, year, rating, features)
+
+    def _store(self, encoded, digest, title, year, rating, features):
+        slots = self._slots
+        slot = self._find(slots, encoded, digest)
+        row = slots[slot]
+        if row == EMPTY:
+            # Lookups from other threads may run meanwhile: the row's data goes in
+            # first, and the slot pointing at it is written last
+            row = len(self._id_hashes)
+            self._ids.extend(encoded)
+            self._id_offsets.append(len(self._ids))
+            self._titles.extend(title)
+            self._title_offsets.append(len(self._titles))
+            self._years.append(0)
+            self._ratings.append(rating)
+            for key in FEATURE_KEYS:
+                self._values[key].extend(features[key])
+                self._offsets[key].append(len(self._values[key]))
+            self._set_year(row, year)
+            self._id_hashes.append(digest)
+            slots[slot] = row
+            self._size = row + 1
+            if 2 * len(self) > len(slots):
+                self._grow()
+        else:
+            self._replace(self._titles, self._title_offsets, row, title)
+            for key in FEATURE_KEYS:
+                self._replace(self._values[key], self._offsets[key], row, features[key])
+            self._set_year(row, year)
+            self._ratings[row] = rating
+            self._replaced.append(row)
+            if len(self._replaced) > REPLACEMENT_LOG_SIZE:
+                # Drop the older half at once, so trimming stays cheap per replacement
+                dropped = len(self._replaced) // 2
+                del self._replaced[:dropped]
+                self._replaced_start += dropped
+            self.replacements += 1
+            self._feature_set_cache.clear()
+
+    def _set_year(self, row, year):
+        if isinstance(year, int) and not isinstance(year, bool):
+            self._years[row] = year
+            self._odd_years.pop(row, None)
+        else:
+            self._odd_years[row] = year
+
+    def replaced_since(self, replacements):
+        """Rows overwritten after the given replacement count, or None if no longer logged"""
+        if replacements < self._replaced_start:
+            return None
+        return self._replaced[replacements - self._replaced_start:]
+
+    @staticmethod
+    def _replace(values, offsets, row, new):
+        start, end = offsets[row], offsets[row + 1]
+        values[start:end] = new
+        shift = len(new) - (end - start)
+        if shift:
+            # Shift the starts of every later row without a Python-level loop
+            shifted = np.frombuffer(offsets, dtype=np.int64)
+            shifted[row + 1:] += shift
+            del shifted
+
+    def __delitem__(self, movie_id):
+        raise TypeError("Movies cannot be removed from the catalog")
+
+    def title(self, row):
+        with self.lock:
+            return self._titles[self._title_offsets[row]:self._title_offsets[row + 1]].decode('utf-8')
+
+    def year(self, row):
+        return self._odd_years.get(row, self._years[row])
+
+    def feature_ids(self, row, key):
+        """Name IDs of one attribute of the movie in the given row"""
+        with self.lock:
+            offsets = self._offsets[key]
+            return self._values[key][offsets[row]:offsets[row + 1]]
+
+    def feature_sets(self, movie_id):
+        """Sets of interned genre, director and cast IDs of a movie"""
+        sets = self._feature_set_cache.get(movie_id)
+        if sets is None:
+            row = self.row(movie_id)
+            sets = tuple(frozenset(self.feature_ids(row, key)) for key in FEATURE_KEYS)
+            if len(self._feature_set_cache) >= FEATURE_SET_CACHE_SIZE:
+                self._feature_set_cache.clear()
+            self._feature_set_cache[movie_id] = sets
+        return sets
+
+    def csr_arrays(self, key):
+        """Copies of (indptr, indices) of one attribute, ready for a sparse matrix"""
+        # Copied under the lock: a numpy view of an array stops writers from growing it
+        with self.lock:
+            indptr = np.array(self._offsets[key], dtype=np.int64)[:len(self) + 1]
+            return indptr, np.array(self._values[key], dtype=np.int32)[:indptr[-1]]
+
+
+def measure_memory(n_movies=1000000):
+    """Compare the heap of a dict-of-dicts catalog with a MovieCatalog holding the same movies"""
+    import gc
+    import tracemalloc
+
+    from synthetic import synthetic_catalog
+
+    tracemalloc.start()
+    movies = synthetic_catalog(n_movies)
+    gc.collect()
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    catalog = MovieCatalog(movies)
+    del movies
+    gc.collect()
+    catalog_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"{n_movies} movies: dicts {dict_bytes / 2 ** 20:.0f} MiB, "
+          f"catalog {catalog_bytes / 2 ** 20:.0f} MiB ({dict_bytes / catalog_bytes:.1f}x smaller)")
+    return catalog
+
+
+if __name__ == "__main__":
+    import sys
+
+    measure_memory(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
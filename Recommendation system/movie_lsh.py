@@ -0,0 +1,134 @@
+import time
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+# Mersenne prime for the universal hash family; keeps a * x + b inside uint64
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+def movie_tokens(details):
+    """Feature set of a movie used for MinHash: its genres, directors and top cast"""
+    tokens = {'g:' + genre for genre in details['genres']}
+    tokens.update('d:' + name for name in details['director'])
+    tokens.update('c:' + name for name in details['cast'])
+    return tokens
+
+
+class MinHashLSHIndex:
+    """MinHash signatures over movie feature sets, banded into an LSH index
+
+    More bands of fewer rows raise recall and the number of candidates;
+    fewer, wider bands make candidate generation cheaper but lossier.
+    """
+
+    def __init__(self, num_perm=64, bands=32, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+        self.signatures = {}  # movie key -> MinHash signature
+        self.buckets = [defaultdict(list) for _ in range(bands)]  # band -> {band hash -> movie keys}
+
+    def signature(self, tokens):
+        """MinHash signature of a token set, or None for an empty set"""
+        if not tokens:
+            return None
+        hashes = np.array([zlib.crc32(token.encode('utf-8')) % MERSENNE_PRIME for token in tokens], dtype=np.uint64)
+        permuted = (np.outer(hashes, self._a) + self._b) % MERSENNE_PRIME
+        return permuted.min(axis=0)
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows_per_band:(band + 1) * self.rows_per_band].tobytes()
+
+    def add(self, movie_key, tokens):
+        """Index a movie by ID or catalog row; movies without any feature can never be similar and are skipped"""
+        signature = self.signature(tokens)
+        if signature is None or movie_key in self.signatures:
+            return
+        self.signatures[movie_key] = signature
+        for band, key in self._band_keys(signature):
+            self.buckets[band][key].append(movie_key)
+
+    def remove(self, movie_key):
+        """Drop a movie from the index, e.g. before adding it again with new features"""
+        signature = self.signatures.pop(movie_key, None)
+        if signature is None:
+            return
+        for band, key in self._band_keys(signature):
+            bucket = self.buckets[band][key]
+            bucket.remove(movie_key)
+            if not bucket:
+                del self.buckets[band][key]
+
+    def clear(self):
+        self.signatures = {}
+        self.buckets = [defaultdict(list) for _ in range(self.bands)]
+
+    def query(self, movie_key):
+        """Keys of movies sharing at least one band with an indexed movie"""
+        signature = self.signatures.get(movie_key)
+        if signature is None:
+            return set()
+        candidates = set()
+        for band, key in self._band_keys(signature):
+            candidates.update(self.buckets[band].get(key, ()))
+        return candidates
+
+    def __len__(self):
+        return len(self.signatures)
+
+
+def benchmark(n_movies=20000, n_users=50, ratings_per_user=20, n_recommendations=10, num_perm=64, bands=32):
+    """Report recall@N and latency of the approximate path against the exact one"""
+    from Movie import IMDBMovieRecommender
+    from synthetic import synthetic_catalog, synthetic_user_ratings
+
+    recommender = IMDBMovieRecommender(ia=object())
+    recommender.movies.update(synthetic_catalog(n_movies))
+    recommender.movie_ratings.update(synthetic_user_ratings(recommender.movies, n_users, ratings_per_user, seed=1))
+
+    start = time.perf_counter()
+    recommender.enable_approximate(num_perm=num_perm, bands=bands)
+    recommender.get_recommendations(0, n_recommendations, approximate=True)
+    build_time = time.perf_counter() - start
+
+    recalls = []
+    exact_time = approximate_time = 0.0
+    for user_id in range(n_users):
+        start = time.perf_counter()
+        exact = recommender.get_recommendations(user_id, n_recommendations)
+        exact_time += time.perf_counter() - start
+        start = time.perf_counter()
+        approximate = recommender.get_recommendations(user_id, n_recommendations, approximate=True)
+        approximate_time += time.perf_counter() - start
+        # Approximate results carry exact scores, so an item counts as recalled when it
+        # scores at least as well as the N-th exact result (many candidates tie on score)
+        if exact:
+            cutoff = exact[-1][1]
+            recalls.append(sum(1 for _, score, *_ in approximate if score >= cutoff) / len(exact))
+
+    print(f"catalog={n_movies} users={n_users} num_perm={num_perm} bands={bands}")
+    print(f"index build: {build_time:.2f}s")
+    print(f"recall@{n_recommendations}: {sum(recalls) / len(recalls):.3f}")
+    print(f"exact: {1000 * exact_time / n_users:.1f} ms/user, approximate: {1000 * approximate_time / n_users:.1f} ms/user")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark MinHash/LSH candidate generation")
+    parser.add_argument('--movies', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--ratings', type=int, default=20)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--num-perm', type=int, default=64)
+    parser.add_argument('--bands', type=int, default=32)
+    args = parser.parse_args()
+    benchmark(args.movies, args.users, args.ratings, args.top, args.num_perm, args.bands)
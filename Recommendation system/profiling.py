@@ -0,0 +1,49 @@
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+
+class StageTimer:
+    """Accumulates wall-clock time per named stage (fetch, similarity, ranking, ...)
+
+    Attach one to a recommender's ``timer`` attribute to switch the hooks on;
+    with ``timer = None`` each hook costs a single attribute check.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}  # stage -> [calls, total seconds, slowest call]
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                stats = self.stages.setdefault(name, [0, 0.0, 0.0])
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] = max(stats[2], elapsed)
+
+    def export(self, reset=False):
+        """Per-stage calls, total, mean and max milliseconds, e.g. for a metrics endpoint"""
+        with self._lock:
+            exported = {
+                name: {
+                    'calls': calls,
+                    'total_ms': 1000 * total,
+                    'mean_ms': 1000 * total / calls,
+                    'max_ms': 1000 * slowest,
+                }
+                for name, (calls, total, slowest) in self.stages.items()
+            }
+            if reset:
+                self.stages = {}
+        return exported
+
+
+def timed(timer, name):
+    """Context manager timing a stage on timer, or doing nothing when timer is None"""
+    return timer.stage(name) if timer is not None else nullcontext()
@@ -0,0 +1,278 @@
+import json
+import mmap
+import os
+import struct
+import threading
+from collections.abc import MutableMapping
+
+import numpy as np
+
+SNAPSHOT_MAGIC = b'RATINGS1'
+# Magic, then user count, item count, rating count and the byte length of the names blob
+SNAPSHOT_HEADER = struct.Struct('<8s4Q')
+
+
+def write_snapshot(path, user_names, item_names, offsets, items, ratings):
+    """Write a snapshot atomically: header, names as JSON, then the CSR arrays
+
+    offsets (int64, one more than users) delimit each user's slice of items
+    (int32 item numbers) and ratings (float64).
+    """
+    names = json.dumps([user_names, item_names], separators=(',', ':')).encode('utf-8')
+    names += b' ' * (-len(names) % 8)  # Keep the arrays 8-byte aligned
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(user_names), len(item_names), len(items), len(names)))
+        f.write(names)
+        for array, dtype in ((offsets, np.int64), (items, np.int32), (ratings, np.float64)):
+            f.write(np.ascontiguousarray(array, dtype=dtype).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+
+class RatingStore(MutableMapping):
+    """user_id -> {item_id -> rating} kept on disk as a snapshot plus an append-only log
+
+    The snapshot is memory-mapped, and a user's ratings are only turned into
+    a dict the first time they are read; the log holds every change made
+    since the snapshot and is replayed on open. Writes never compact on
+    their own: call maybe_compact() (ingest_ratings does after each chunk,
+    the recommenders on close) to fold the log into a fresh snapshot once
+    it holds compact_every records, somewhere a pause is acceptable.
+
+    Ratings changed through a dict returned by store[user_id] are only
+    durable once they go through log() (add_user_rating does that); whole
+    users assigned or deleted on the store are logged right away. Every
+    write reaches the OS before log() returns, so it survives a crash of
+    the process; pass fsync=True to also survive power loss.
+    """
+
+    def __init__(self, directory, compact_every=1000000, fsync=False):
+        os.makedirs(directory, exist_ok=True)
+        self.snapshot_path = os.path.join(directory, 'ratings.snapshot')
+        self.log_path = os.path.join(directory, 'ratings.log')
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self._lock = threading.RLock()
+        self._users = {}  # user_id -> ratings dict, for users read or changed since the snapshot
+        self._removed = set()  # Snapshot users deleted since the snapshot
+        self._pending = {}  # user_id -> logged ratings of a snapshot user not read yet
+        self._open_snapshot()
+        self.logged = self._replay()
+        self._log = open(self.log_path, 'a', encoding='utf-8')
+
+    def _open_snapshot(self):
+        self._mmap = None
+        self.user_names, self.item_names = [], []
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._items = np.zeros(0, dtype=np.int32)
+        self._ratings = np.zeros(0, dtype=np.float64)
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'rb') as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, n_users, n_items, n_ratings, names_size = SNAPSHOT_HEADER.unpack_from(self._mmap)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"{self.snapshot_path} is not a rating snapshot")
+            start = SNAPSHOT_HEADER.size
+            self.user_names, self.item_names = json.loads(self._mmap[start:start + names_size])
+            start += names_size
+            self._offsets = np.frombuffer(self._mmap, dtype=np.int64, count=n_users + 1, offset=start)
+            start += 8 * (n_users + 1)
+            self._items = np.frombuffer(self._mmap, dtype=np.int32, count=n_ratings, offset=start)
+            start += 4 * n_ratings
+            self._ratings = np.frombuffer(self._mmap, dtype=np.float64, count=n_ratings, offset=start)
+        self._user_index = {user_id: i for i, user_id in enumerate(self.user_names)}
+
+    def _replay(self):
+        """Apply the log on top of the snapshot, dropping a torn last record"""
+        if not os.path.exists(self.log_path):
+            return 0
+        records = 0
+        good = 0
+        with open(self.log_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                self._apply(json.loads(line))
+                records += 1
+                good += len(line)
+        if good != os.path.getsize(self.log_path):
+            with open(self.log_path, 'r+b') as f:
+                f.truncate(good)
+        return records
+
+    def _apply(self, record):
+        if len(record) == 3:
+            user_id, item_id, rating = record
+            if user_id in self._users or user_id not in self:
+                self[user_id][item_id] = rating
+            else:
+                # Merged when the user is first read, so replay never decodes snapshot slices
+                self._pending.setdefault(user_id, {})[item_id] = rating
+        elif len(record) == 2:
+            self._set(record[0], dict(record[1]))
+        elif record[0] in self:
+            # A log replayed over the snapshot it was folded into may delete users already gone
+            self._delete(record[0])
+
+    def _snapshot_ratings(self, i):
+        start, end = self._offsets[i], self._offsets[i + 1]
+        item_names = self.item_names
+        return dict(zip([item_names[item] for item in self._items[start:end].tolist()],
+                        self._ratings[start:end].tolist()))
+
+    def __getitem__(self, user_id):
+        ratings = self._users.get(user_id)
+        if ratings is None:
+            # Like defaultdict(dict): unknown users start out with no ratings
+            with self._lock:
+                ratings = self._users.get(user_id)
+                if ratings is None:
+                    i = self._user_index.get(user_id)
+                    if i is not None and user_id not in self._removed:
+                        ratings = self._snapshot_ratings(i)
+                        ratings.update(self._pending.pop(user_id, ()))
+                    else:
+                        ratings = {}
+                    self._set(user_id, ratings)
+        return ratings
+
+    def __contains__(self, user_id):
+        return user_id in self._users or (user_id in self._user_index and user_id not in self._removed)
+
+    def __iter__(self):
+        for user_id in self.user_names:
+            if user_id not in self._removed:
+                yield user_id
+        for user_id in list(self._users):
+            if user_id not in self._user_index:
+                yield user_id
+
+    def __len__(self):
+        new_users = sum(1 for user_id in self._users if user_id not in self._user_index)
+        return len(self.user_names) - len(self._removed) + new_users
+
+    def _set(self, user_id, ratings):
+        self._users[user_id] = ratings
+        self._removed.discard(user_id)
+        self._pending.pop(user_id, None)
+
+    def _delete(self, user_id):
+        if user_id not in self:
+            raise KeyError(user_id)
+        self._users.pop(user_id, None)
+        self._pending.pop(user_id, None)
+        if user_id in self._user_index:
+            self._removed.add(user_id)
+
+    def __setitem__(self, user_id, ratings):
+        with self._lock:
+            ratings = dict(ratings)
+            self._set(user_id, ratings)
+            self._write([user_id, list(ratings.items())])
+
+    def __delitem__(self, user_id):
+        with self._lock:
+            self._delete(user_id)
+            self._write([user_id])
+
+    def log(self, user_id, item_id, rating):
+        """Record one rating durably, setting it in the user's dict if not already there"""
+        with self._lock:
+            self[user_id][item_id] = rating
+            self._write([user_id, item_id, rating])
+
+    def log_many(self, ratings):
+        """Record (user_id, item_id, rating) triples with a single write, e.g. for bulk loads"""
+        with self._lock:
+            records = []
+            for user_id, item_id, rating in ratings:
+                self[user_id][item_id] = rating
+                records.append([user_id, item_id, rating])
+            self._write(*records)
+
+    def _write(self, *records):
+        self._log.write(''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records))
+        self._log.flush()
+        if self.fsync:
+            os.fsync(self._log.fileno())
+        self.logged += len(records)
+
+    @property
+    def needs_compaction(self):
+        return self.logged >= self.compact_every
+
+    def maybe_compact(self):
+        """Compact if the log has reached compact_every records; returns whether it did"""
+        if not self.needs_compaction:
+            return False
+        self.compact()
+        return True
+
+    def compact(self):
+        """Fold the log into a new snapshot and start an empty log"""
+        with self._lock:
+            item_index = {item_id: i for i, item_id in enumerate(self.item_names)}
+            item_names = list(self.item_names)
+            user_names, lengths, item_chunks, rating_chunks = [], [], [], []
+            for i, user_id in enumerate(self.user_names):
+                if user_id in self._removed:
+                    continue
+                ratings = self._users.get(user_id)
+                if ratings is None and user_id in self._pending:
+                    ratings = self[user_id]
+                if ratings is None:
+                    # Untouched since the last snapshot: copy the slice as it is
+                    start, end = self._offsets[i], self._offsets[i + 1]
+                    item_chunks.append(self._items[start:end])
+                    rating_chunks.append(self._ratings[start:end])
+                    lengths.append(end - start)
+                else:
+                    self._encode(ratings, item_index, item_names, lengths, item_chunks, rating_chunks)
+                user_names.append(user_id)
+            for user_id, ratings in self._users.items():
+                if user_id not in self._user_index:
+                    self._encode(ratings, item_index, item_names, lengths, item_chunks, rating_chunks)
+                    user_names.append(user_id)
+            offsets = np.zeros(len(user_names) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=offsets[1:])
+            items = np.concatenate(item_chunks) if item_chunks else np.zeros(0, dtype=np.int32)
+            ratings = np.concatenate(rating_chunks) if rating_chunks else np.zeros(0, dtype=np.float64)
+            write_snapshot(self.snapshot_path, user_names, item_names, offsets, items, ratings)
+
+            # Replaying the old log over the new snapshot would be harmless, so a crash
+            # between writing the snapshot and truncating the log loses nothing
+            self._log.close()
+            self._log = open(self.log_path, 'w', encoding='utf-8')
+            self.logged = 0
+            del items, ratings, item_chunks, rating_chunks
+            self._close_snapshot()
+            self._open_snapshot()
+            # Materialized users stay as they are; dicts handed out keep working
+            self._removed = set()
+
+    @staticmethod
+    def _encode(ratings, item_index, item_names, lengths, item_chunks, rating_chunks):
+        items = []
+        for item_id in ratings:
+            item = item_index.get(item_id)
+            if item is None:
+                item = item_index[item_id] = len(item_names)
+                item_names.append(item_id)
+            items.append(item)
+        item_chunks.append(np.array(items, dtype=np.int32))
+        rating_chunks.append(np.fromiter(ratings.values(), dtype=np.float64, count=len(ratings)))
+        lengths.append(len(ratings))
+
+    def _close_snapshot(self):
+        self._offsets = self._items = self._ratings = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def close(self):
+        """Close the log and the snapshot; everything logged is already on disk"""
+        with self._lock:
+            self._log.close()
+            self._close_snapshot()
@@ -0,0 +1,435 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from Movie import IMDBMovieRecommender
+from book_neighbors import BookFeatureMatrices
+from books import BookRecommender
+from feature_scoring import best_predictions
+from shared_features import attach_features, publish_features
+
+# Longest a recommendation may be scored against a catalog missing newly fetched items
+SNAPSHOT_REFRESH_SECONDS = 1.0
+
+# Snapshots attached in this worker process, by shared memory block name
+_attached = {}
+
+
+def _score_user(handle, rated_rows, ratings, n_recommendations):
+    """Worker process: top-n rows and predicted ratings of one user against a shared snapshot"""
+    name = handle[0]
+    if name not in _attached:
+        # The service moved on to a newer snapshot; let go of the old ones
+        for block, _ in _attached.values():
+            block.close()
+        _attached.clear()
+        _attached[name] = attach_features(handle)
+    features = _attached[name][1]
+    weighted, similarity = features.predicted_ratings(rated_rows, ratings)
+    is_rated = np.zeros(len(features), dtype=bool)
+    is_rated[rated_rows] = True
+    positions, scores = best_predictions(weighted, similarity, is_rated, n_recommendations)
+    return positions.tolist(), scores.tolist()
+
+
+class Snapshot:
+    """Feature matrices of one catalog version, published to shared memory for the workers"""
+
+    def __init__(self, features, version):
+        self.features = features
+        self.version = version  # Catalog.version() the matrices were built at
+        self.block, self.handle = publish_features(features)
+        self.created = time.monotonic()
+        self.in_use = 0  # Scoring tasks still reading the block
+        self.retired = False
+
+    def covers(self, item_id):
+        """Whether the item has a row in the matrices"""
+        features = self.features
+        if isinstance(features, BookFeatureMatrices):
+            return item_id in features.rows
+        return item_id in features.catalog and features.catalog.row(item_id) < len(features)
+
+    def release(self):
+        if self.retired and not self.in_use and self.block is not None:
+            self.block.close()
+            self.block.unlink()
+            self.block = None
+
+
+class Catalog:
+    """One recommender behind the service, with the calls that differ between movies and books"""
+
+    def __init__(self, recommender):
+        self.recommender = recommender
+        self.movies = isinstance(recommender, IMDBMovieRecommender)
+        self.items = recommender.movies if self.movies else recommender.books
+        self.ratings = recommender.movie_ratings if self.movies else recommender.user_ratings
+        self.lock = threading.Lock()  # Serializes rating writes; only taken on worker threads
+        self.snapshot = None
+        self.building = None  # Future of the snapshot being built, if any
+        self.compacting = None  # Future of a rating store compaction, if any
+
+    def search(self, title):
+        if self.movies:
+            return self.recommender.search_movie(title)
+        return self.recommender.search_book(title)
+
+    def fetch(self, item_id):
+        if self.movies:
+            return self.recommender.fetch_movie_details(item_id)
+        return self.recommender.fetch_book_details(item_id)
+
+    def user_ratings(self, user_id):
+        """Copy of a user's ratings; reading a RatingStore may wait out a compaction, so run it off the loop"""
+        if user_id not in self.ratings:
+            raise ValueError("User not found")
+        return dict(self.ratings[user_id])
+
+    def version(self):
+        if self.movies:
+            return len(self.items), self.items.replacements
+        return self.items.version
+
+    def build_features(self):
+        if self.movies:
+            return self.recommender.feature_matrices()
+        return BookFeatureMatrices.from_books(self.items)
+
+    def needs_snapshot(self, needed_items):
+        """Whether the published snapshot lacks a needed item, or is old and out of date"""
+        snapshot = self.snapshot
+        if snapshot is None or not all(snapshot.covers(item_id) for item_id in needed_items):
+            return True
+        return time.monotonic() - snapshot.created > SNAPSHOT_REFRESH_SECONDS and snapshot.version != self.version()
+
+    def build_snapshot(self):
+        """Build and publish a snapshot of the catalog as it stands; blocks, so runs on a worker thread"""
+        with self.recommender.frozen_catalog():
+            version = self.version()
+            features = self.build_features()
+        return Snapshot(features, version)
+
+    async def current_snapshot(self, needed_items, executor):
+        """The published snapshot, replaced first if it lacks a needed item or is old and out of date
+
+        The snapshot is built on the executor, one build at a time; requests
+        arriving meanwhile wait for it, or keep the current snapshot when
+        it only went stale.
+        """
+        while self.needs_snapshot(needed_items):
+            if self.building is None:
+                self.building = asyncio.ensure_future(self._publish(executor))
+            building = self.building
+            if self.snapshot is not None and all(self.snapshot.covers(item_id) for item_id in needed_items):
+                break
+            await asyncio.shield(building)
+        return self.snapshot
+
+    async def _publish(self, executor):
+        try:
+            snapshot = await asyncio.get_running_loop().run_in_executor(executor, self.build_snapshot)
+            if self.snapshot is not None:
+                self.snapshot.retired = True
+                self.snapshot.release()
+            self.snapshot = snapshot
+        finally:
+            self.building = None
+
+
+class RecommendationService:
+    """Line-delimited JSON over TCP in front of a movie and a book recommender
+
+    Each request is one JSON object per line, e.g.
+        {"id": 1, "op": "recommend", "kind": "books", "user_id": "ann", "n": 5}
+    with op one of search (title), rate (user_id, item_id, rating),
+    recommend (user_id, n) or stats, and kind movies or books. Replies carry
+    the same id plus either "result" or "error", and may arrive out of order
+    when a client pipelines requests.
+
+    Metadata fetches run on a thread pool, so a slow backend only holds up
+    the requests waiting on it. Scoring runs on a process pool against the
+    catalog's feature matrices, published once to shared memory and mapped
+    read-only by every worker; a new snapshot is published when a request
+    needs an item the current one lacks, or at most every
+    SNAPSHOT_REFRESH_SECONDS once the catalog has changed.
+    """
+
+    def __init__(self, movies=None, books=None, processes=None, fetch_threads=16):
+        self.catalogs = {}
+        if movies is not None:
+            self.catalogs['movies'] = Catalog(movies)
+        if books is not None:
+            self.catalogs['books'] = Catalog(books)
+        self.fetch_pool = ThreadPoolExecutor(max_workers=fetch_threads)
+        # Snapshot builds and store compactions, kept off the fetch threads and the event loop
+        self.build_pool = ThreadPoolExecutor(max_workers=1)
+        # Forked workers would inherit open client sockets and keep them from closing;
+        # forkserver is Unix-only, so Windows gets spawn
+        self.processes = processes or os.cpu_count()
+        start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        self.score_pool = ProcessPoolExecutor(max_workers=self.processes,
+                                              mp_context=multiprocessing.get_context(start_method))
+        self.requests = 0
+        self.errors = 0
+        self.server = None
+        self.clients = set()  # Connection handler tasks
+
+    async def search(self, catalog, request):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.fetch_pool, catalog.search, request['title'])
+
+    async def rate(self, catalog, request):
+        user_id, item_id, rating = request['user_id'], request['item_id'], request['rating']
+        if not (1 <= rating <= 5):
+            raise ValueError("Rating must be between 1 and 5")
+        loop = asyncio.get_running_loop()
+        # Fetch outside the lock so a slow backend doesn't hold up other raters
+        await loop.run_in_executor(self.fetch_pool, catalog.fetch, item_id)
+
+        def add():
+            with catalog.lock:
+                catalog.recommender.add_user_rating(user_id, item_id, rating)
+        await loop.run_in_executor(self.fetch_pool, add)
+        store = catalog.recommender.store
+        if store is not None and store.needs_compaction and catalog.compacting is None:
+            catalog.compacting = loop.run_in_executor(self.build_pool, store.maybe_compact)
+            catalog.compacting.add_done_callback(lambda _: setattr(catalog, 'compacting', None))
+        return {'user_id': user_id, 'item_id': item_id, 'rating': rating}
+
+    async def recommend(self, catalog, request):
+        loop = asyncio.get_running_loop()
+        user_ratings = await loop.run_in_executor(self.fetch_pool, catalog.user_ratings, request['user_id'])
+        missing = [item_id for item_id in user_ratings if item_id not in catalog.items]
+        if missing:
+            await asyncio.gather(*(loop.run_in_executor(self.fetch_pool, catalog.fetch, item_id)
+                                   for item_id in missing))
+        snapshot = await catalog.current_snapshot(user_ratings, self.build_pool)
+        features = snapshot.features
+        rated_rows = features.rated_rows(user_ratings)
+        snapshot.in_use += 1
+        try:
+            rows, scores = await loop.run_in_executor(
+                self.score_pool, _score_user, snapshot.handle, rated_rows,
+                list(user_ratings.values()), int(request.get('n', 5))
+            )
+        finally:
+            snapshot.in_use -= 1
+            snapshot.release()
+        recommendations = []
+        for row, score in zip(rows, scores):
+            item_id = features.movie_id(row)
+            details = catalog.items[item_id]
+            recommendations.append([item_id, score, details['title'], details['year']])
+        return recommendations
+
+    async def stats(self, catalog, request):
+        loop = asyncio.get_running_loop()
+        # Counting a RatingStore's users walks them all, so it stays off the loop too
+        catalogs = await loop.run_in_executor(self.fetch_pool, lambda: {
+            kind: {'items': len(c.items), 'users': len(c.ratings)} for kind, c in self.catalogs.items()
+        })
+        return {'requests': self.requests, 'errors': self.errors, 'catalogs': catalogs}
+
+    async def handle_request(self, line):
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            handler = {'search': self.search, 'rate': self.rate,
+                       'recommend': self.recommend, 'stats': self.stats}.get(request.get('op'))
+            if handler is None:
+                raise ValueError(f"Unknown op {request.get('op')!r}")
+            catalog = self.catalogs.get(request.get('kind', 'movies'))
+            if catalog is None and handler is not self.stats:
+                raise ValueError(f"Unknown kind {request.get('kind')!r}")
+            reply = {'id': request_id, 'result': await handler(catalog, request)}
+        except Exception as e:
+            self.errors += 1
+            reply = {'id': request_id, 'error': str(e) or type(e).__name__}
+        self.requests += 1
+        return json.dumps(reply) + '\n'
+
+    async def handle_client(self, reader, writer):
+        client = asyncio.current_task()
+        self.clients.add(client)
+        tasks = set()
+
+        async def answer(line):
+            reply = await self.handle_request(line)
+            writer.write(reply.encode('utf-8'))
+            await writer.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.create_task(answer(line))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            self.clients.discard(client)
+
+    async def serve(self, host='127.0.0.1', port=8765):
+        """Listen until cancelled"""
+        # Publish up front so the first recommendation doesn't pay for it
+        for catalog in self.catalogs.values():
+            if len(catalog.items):
+                await catalog.current_snapshot((), self.build_pool)
+        # Start the workers too; each imports this module (numpy, scipy, ...) on startup
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.score_pool, os.getpid)
+                               for _ in range(self.processes)))
+        self.server = await asyncio.start_server(self.handle_client, host, port, limit=2 ** 20)
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def stop(self):
+        """Stop accepting connections and wait for the open ones to finish"""
+        self.server.close()
+        await self.server.wait_closed()
+        if self.clients:
+            await asyncio.gather(*self.clients, return_exceptions=True)
+
+    def close(self):
+        self.fetch_pool.shutdown()
+        self.build_pool.shutdown()
+        self.score_pool.shutdown()
+        for catalog in self.catalogs.values():
+            if catalog.snapshot is not None:
+                catalog.snapshot.retired = True
+                catalog.snapshot.in_use = 0
+                catalog.snapshot.release()
+            catalog.recommender.close()
+
+
+async def _load_client(host, port, kind, users, items, n_requests, rate_share, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port, limit=2 ** 20)
+    rng = random.Random()
+    try:
+        for request_id in range(n_requests):
+            if rng.random() < rate_share:
+                request = {'op': 'rate', 'user_id': rng.choice(users), 'item_id': rng.choice(items),
+                           'rating': rng.randint(1, 5)}
+            else:
+                request = {'op': 'recommend', 'user_id': rng.choice(users), 'n': 10}
+            request.update(id=request_id, kind=kind)
+            start = time.perf_counter()
+            writer.write((json.dumps(request) + '\n').encode('utf-8'))
+            await writer.drain()
+            reply = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - start)
+            if 'error' in reply:
+                errors.append(reply['error'])
+    finally:
+        writer.close()
+
+
+async def run_load(host, port, kind, users, items, clients=50, requests_per_client=100, rate_share=0.1):
+    """Drive the service from many concurrent connections and report requests/sec and latency percentiles"""
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        _load_client(host, port, kind, users, items, requests_per_client, rate_share, latencies, errors)
+        for _ in range(clients)
+    ))
+    elapsed = time.perf_counter() - start
+    latencies = np.array(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'seconds': elapsed,
+        'requests_per_sec': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+    }
+
+
+def synthetic_service(n_items, n_users, ratings_per_user, latency, processes):
+    """Service over synthetic catalogs and offline fake backends"""
+    from fake_backends import FakeGoogleBooks, FakeIMDb
+    from synthetic import synthetic_books, synthetic_catalog, synthetic_user_ratings
+
+    movie_catalog = synthetic_catalog(n_items)
+    book_catalog = synthetic_books(n_items)
+    # Only part of each catalog starts loaded; the rest gets fetched as users rate it
+    movies = IMDBMovieRecommender(ia=FakeIMDb(movie_catalog, latency=latency))
+    movies.movies.update({movie_id: movie_catalog[movie_id] for movie_id in list(movie_catalog)[:n_items // 2]})
+    movies.movie_ratings.update(synthetic_user_ratings(movies.movies, n_users, ratings_per_user))
+    books = BookRecommender(http=FakeGoogleBooks(book_catalog, latency=latency))
+    books.books.update({book_id: book_catalog[book_id] for book_id in list(book_catalog)[:n_items // 2]})
+    books.user_ratings.update(synthetic_user_ratings(books.books, n_users, ratings_per_user))
+    return RecommendationService(movies, books, processes=processes)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve both recommenders over line-delimited JSON, or load test them")
+    parser.add_argument('mode', choices=['serve', 'load', 'bench'],
+                        help="bench serves synthetic data and runs the load generator against it")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--synthetic', type=int, default=0, help="serve this many synthetic movies and books")
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--ratings-per-user', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.05, help="fake backend latency for synthetic data")
+    parser.add_argument('--kind', choices=['movies', 'books'], default='movies')
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=100, help="requests per client")
+    parser.add_argument('--rate-share', type=float, default=0.1)
+    args = parser.parse_args()
+
+    async def bench(service):
+        server = asyncio.create_task(service.serve(args.host, args.port))
+        while service.server is None:
+            await asyncio.sleep(0.01)
+        for kind in ('movies', 'books'):
+            # Rate across the whole synthetic catalog, so some ratings need a fetch
+            prefix = 'tt' if kind == 'movies' else 'vol'
+            items = [prefix + '%07d' % i for i in range(args.synthetic)]
+            stats = await run_load(args.host, args.port, kind, list(range(args.users)), items,
+                                   args.clients, args.requests, args.rate_share)
+            print(f"{kind}: {stats['requests']} requests ({stats['errors']} errors) in {stats['seconds']:.1f}s, "
+                  f"{stats['requests_per_sec']:.0f} req/s, p50 {stats['p50_ms']:.1f} ms, p99 {stats['p99_ms']:.1f} ms")
+        await service.stop()
+        server.cancel()
+
+    if args.mode == 'load':
+        stats = asyncio.run(run_load(args.host, args.port, args.kind, list(range(args.users)), [],
+                                     args.clients, args.requests, 0.0))
+        print(json.dumps(stats, indent=2))
+        return
+    if args.synthetic:
+        service = synthetic_service(args.synthetic, args.users, args.ratings_per_user, args.latency, args.processes)
+    else:
+        service = RecommendationService(IMDBMovieRecommender(), BookRecommender(), processes=args.processes)
+    try:
+        if args.mode == 'bench':
+            asyncio.run(bench(service))
+        else:
+            print(f"Serving {', '.join(service.catalogs)} on {args.host}:{args.port}")
+            asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
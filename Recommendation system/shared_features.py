@@ -0,0 +1,54 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+from scipy import sparse
+
+from feature_scoring import MovieFeatureMatrices
+
+
+def publish_features(features):
+    """Copy the CSR arrays of the feature matrices into one shared memory block
+
+    Returns the block, which the caller must close and unlink when done, and a
+    small picklable handle that worker processes pass to attach_features.
+    """
+    arrays = []
+    for matrix in features.matrices:
+        arrays.extend([matrix.data, matrix.indices, matrix.indptr])
+    layout = []
+    offset = 0
+    for array in arrays:
+        layout.append((offset, array.dtype.str, array.shape))
+        # Keep every array 8-byte aligned
+        offset += (array.nbytes + 7) // 8 * 8
+    block = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for array, (start, dtype, shape) in zip(arrays, layout):
+        np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=start)[...] = array
+    shapes = [matrix.shape for matrix in features.matrices]
+    return block, (block.name, layout, shapes, features.weights)
+
+
+def attach_features(handle):
+    """Map shared feature matrices read-only, without copying them
+
+    Returns the attached block, which must stay referenced while the matrices
+    are in use, and a MovieFeatureMatrices scoring by row with the weights of
+    the published matrices (movie or book).
+    """
+    name, layout, shapes, weights = handle
+    block = shared_memory.SharedMemory(name=name)
+    arrays = []
+    for start, dtype, shape in layout:
+        array = np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=start)
+        array.flags.writeable = False
+        arrays.append(array)
+    matrices = []
+    for i, shape in enumerate(shapes):
+        data, indices, indptr = arrays[3 * i:3 * i + 3]
+        matrix = sparse.csr_matrix((data, indices, indptr), shape=shape, copy=False)
+        # Both the movie and book matrices are built with sorted, unique columns per row
+        matrix.has_canonical_format = True
+        matrices.append(matrix)
+    features = MovieFeatureMatrices(matrices)
+    features.weights = weights
+    return block, features
@@ -0,0 +1,68 @@
+import random
+
+import numpy as np
+
+
+def synthetic_catalog(n_movies, seed=0):
+    """Clustered synthetic catalog: movies of a cluster share directors and cast pools"""
+    rng = random.Random(seed)
+    genres = ['genre%d' % i for i in range(25)]
+    n_clusters = max(1, n_movies // 50)
+    movies = {}
+    for i in range(n_movies):
+        cluster = rng.randrange(n_clusters)
+        movies['tt%07d' % i] = {
+            'title': 'Movie %d' % i,
+            'year': 1950 + rng.randrange(75),
+            'genres': rng.sample(genres[cluster % 20:cluster % 20 + 6], rng.randint(1, 3)),
+            'director': ['director%d' % (cluster * 3 + rng.randrange(3))],
+            'cast': ['actor%d' % (cluster * 20 + rng.randrange(20)) for _ in range(5)],
+            'rating': round(rng.uniform(1, 10), 1)
+        }
+    return movies
+
+
+def synthetic_books(n_books, seed=0):
+    """Synthetic Google Books volumes, keyed by volume ID, in the shape BookRecommender stores"""
+    rng = random.Random(seed)
+    categories = ['Category %d' % i for i in range(40)]
+    n_clusters = max(1, n_books // 50)
+    books = {}
+    for i in range(n_books):
+        cluster = rng.randrange(n_clusters)
+        books['vol%07d' % i] = {
+            'title': 'Book %d' % i,
+            'authors': ['Author %d' % (cluster * 4 + rng.randrange(4)) for _ in range(rng.randint(1, 2))],
+            'year': str(1900 + rng.randrange(125)),
+            'genres': rng.sample(categories[cluster % 30:cluster % 30 + 8], rng.randint(1, 2)),
+            'rating': round(rng.uniform(1, 5), 1)
+        }
+    return books
+
+
+def synthetic_user_ratings(item_ids, n_users, ratings_per_user, seed=0):
+    """user_id -> {item_id -> rating} with uniformly sampled items and 1-5 ratings"""
+    rng = random.Random(seed)
+    item_ids = list(item_ids)
+    ratings = {}
+    for user_id in range(n_users):
+        ratings[user_id] = {item_id: rng.randint(1, 5)
+                            for item_id in rng.sample(item_ids, min(ratings_per_user, len(item_ids)))}
+    return ratings
+
+
+def synthetic_ratings(n_users, n_items, n_ratings, rank=8, seed=0):
+    """Ratings on a 1-5 scale drawn from a hidden low-rank model, MovieLens-style"""
+    rng = np.random.default_rng(seed)
+    users = rng.normal(size=(n_users, rank))
+    items = rng.normal(size=(n_items, rank))
+    # Popular items get rated more often, like in real catalogs
+    popularity = rng.permutation(1.0 / np.arange(1, n_items + 1) ** 0.8)
+    user_picks = rng.integers(0, n_users, size=n_ratings)
+    item_picks = rng.choice(n_items, size=n_ratings, p=popularity / popularity.sum())
+    raw = np.einsum('ij,ij->i', users[user_picks], items[item_picks]) / np.sqrt(rank)
+    values = np.clip(np.round(3 + 1.2 * raw + rng.normal(scale=0.5, size=n_ratings)), 1, 5)
+    ratings = {}
+    for user, item, value in zip(user_picks.tolist(), item_picks.tolist(), values.tolist()):
+        ratings.setdefault(user, {})[item] = value
+    return ratings
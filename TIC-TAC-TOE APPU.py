@@ -1,132 +1,141 @@
 import tkinter as tk
 from tkinter import messagebox
-import math
-
-# Set up the main application window
-window = tk.Tk()
-window.title("Tic-Tac-Toe")
-
-# Initialize the game board and variables
-board = [' ' for _ in range(9)]
-human = 'O'
-ai = 'X'
-
-# Function to reset the game board
-def reset_game():
-    global board
-    board = [' ' for _ in range(9)]
-    for button in buttons:
-        button.config(text=" ", state=tk.NORMAL)
-
-# Function to print the board to the console (for debugging)
-def print_board():
-    for row in [board[i*3:(i+1)*3] for i in range(3)]:
-        print(row)
-    print()
-
-# Function to check if the board is full
-def is_full(board):
-    return ' ' not in board
-
-# Function to check for a win
-def check_winner(board):
-    winning_combinations = [
-        [0, 1, 2], [3, 4, 5], [6, 7, 8],  # Rows
-        [0, 3, 6], [1, 4, 7], [2, 5, 8],  # Columns
-        [0, 4, 8], [2, 4, 6]              # Diagonals
-    ]
-    for combo in winning_combinations:
-        if board[combo[0]] == board[combo[1]] == board[combo[2]] != ' ':
-            return board[combo[0]]
-    return None
-
-# Minimax function with Alpha-Beta Pruning
-def minimax(board, depth, alpha, beta, is_maximizing):
-    winner = check_winner(board)
-    if winner == ai:
-        return 10 - depth
-    elif winner == human:
-        return depth - 10
-    elif is_full(board):
-        return 0
-
-    if is_maximizing:
-        max_eval = -math.inf
-        for i in range(9):
-            if board[i] == ' ':
-                board[i] = ai
-                eval = minimax(board, depth + 1, alpha, beta, False)
-                board[i] = ' '
-                max_eval = max(max_eval, eval)
-                alpha = max(alpha, eval)
-                if beta <= alpha:
-                    break
-        return max_eval
-    else:
-        min_eval = math.inf
-        for i in range(9):
-            if board[i] == ' ':
-                board[i] = human
-                eval = minimax(board, depth + 1, alpha, beta, True)
-                board[i] = ' '
-                min_eval = min(min_eval, eval)
-                beta = min(beta, eval)
-                if beta <= alpha:
-                    break
-        return min_eval
-
-# Function for the AI's move
-def ai_move():
-    best_score = -math.inf
-    best_move = None
-    for i in range(9):
-        if board[i] == ' ':
-            board[i] = ai
-            score = minimax(board, 0, -math.inf, math.inf, False)
-            board[i] = ' '
-            if score > best_score:
-                best_score = score
-                best_move = i
-    if best_move is not None:
-        board[best_move] = ai
-        buttons[best_move].config(text=ai)
-        if check_winner(board) == ai:
-            messagebox.showinfo("Game Over", "AI wins!")
-            disable_buttons()
-        elif is_full(board):
-            messagebox.showinfo("Game Over", "It's a draw!")
-            disable_buttons()
-
-# Function to handle human move
-def handle_click(i):
-    if board[i] == ' ':
-        board[i] = human
-        buttons[i].config(text=human)
-        if check_winner(board) == human:
+import argparse
+import threading
+
+from tictactoe_classic import ai, benchmark, best_move, check_winner, human, is_full, solve
+from tictactoe_engine import Engine, Game
+
+
+class TicTacToeApp:
+    """The game window and board; the AI searches on a worker thread
+
+    The classic 3x3 game uses the minimax from tictactoe_classic, larger
+    boards the bitboard engine within time_budget seconds per move. While
+    the AI thinks the window keeps handling events; the worker posts its
+    move back through window.after, so only the Tk thread touches widgets.
+    """
+
+    def __init__(self, window, size=3, k=None, time_budget=1.0):
+        self.window = window
+        self.size = size
+        self.game = Game(size, k)
+        self.engine = None if (size, self.game.k) == (3, 3) else Engine(self.game)
+        self.time_budget = time_budget
+        self.board = [' ' for _ in range(size * size)]
+        self.thinking = False
+        self.generation = 0  # Bumped on reset, so a search for the previous game is ignored
+        self._search_lock = threading.Lock()  # One search at a time; the tables aren't shared safely
+
+        # Create a grid of buttons for the board
+        self.buttons = []
+        font_size = 24 if size == 3 else max(10, 72 // size)
+        for i in range(size * size):
+            button = tk.Button(window, text=" ", font=("Arial", font_size), width=5 if size == 3 else 3, height=2,
+                               command=lambda i=i: self.handle_click(i))
+            button.grid(row=i // size, column=i % size)
+            self.buttons.append(button)
+
+        # Reset button and status line
+        reset_button = tk.Button(window, text="Reset", font=("Arial", 14), command=self.reset_game)
+        reset_button.grid(row=size, column=0, columnspan=size)
+        self.status = tk.Label(window, text="", font=("Arial", 12))
+        self.status.grid(row=size + 1, column=0, columnspan=size)
+
+    # Function to reset the game board
+    def reset_game(self):
+        self.board = [' ' for _ in range(self.size * self.size)]
+        self.generation += 1
+        self.thinking = False
+        self.status.config(text="")
+        for button in self.buttons:
+            button.config(text=" ", state=tk.NORMAL)
+
+    def winner(self):
+        if self.engine is None:
+            return check_winner(self.board)
+        for symbol in (human, ai):
+            if self.game.has_line(self.game.bits(self.board, symbol)):
+                return symbol
+        return None
+
+    # Function to handle human move
+    def handle_click(self, i):
+        if self.thinking or self.board[i] != ' ':
+            return
+        self.board[i] = human
+        self.buttons[i].config(text=human)
+        if self.winner() == human:
             messagebox.showinfo("Game Over", "You win!")
-            disable_buttons()
-        elif is_full(board):
+            self.disable_buttons()
+        elif is_full(self.board):
             messagebox.showinfo("Game Over", "It's a draw!")
-            disable_buttons()
+            self.disable_buttons()
         else:
-            ai_move()
-
-# Function to disable all buttons after game ends
-def disable_buttons():
-    for button in buttons:
-        button.config(state=tk.DISABLED)
-
-# Create a 3x3 grid of buttons for the board
-buttons = []
-for i in range(9):
-    button = tk.Button(window, text=" ", font=("Arial", 24), width=5, height=2,
-                       command=lambda i=i: handle_click(i))
-    button.grid(row=i//3, column=i%3)
-    buttons.append(button)
-
-# Reset button
-reset_button = tk.Button(window, text="Reset", font=("Arial", 14), command=reset_game)
-reset_button.grid(row=3, column=0, columnspan=3)
-
-# Start the GUI event loop
-window.mainloop()
+            self.start_ai_move()
+
+    # Start the AI's search in the background
+    def start_ai_move(self):
+        self.thinking = True
+        self.status.config(text="AI is thinking...")
+        worker = threading.Thread(target=self._search, args=(list(self.board), self.generation), daemon=True)
+        worker.start()
+
+    def choose_move(self, board):
+        if self.engine is None:
+            return best_move(board)
+        result = self.engine.best_move(self.game.bits(board, ai), self.game.bits(board, human), self.time_budget)
+        return result['move']
+
+    def _search(self, board, generation):
+        with self._search_lock:
+            move = self.choose_move(board)
+        self.window.after(0, self.finish_ai_move, move, generation)
+
+    # Function for the AI's move, back on the Tk thread
+    def finish_ai_move(self, move, generation):
+        if generation != self.generation:
+            return  # The board was reset while the AI was thinking
+        self.thinking = False
+        self.status.config(text="")
+        if move is not None:
+            self.board[move] = ai
+            self.buttons[move].config(text=ai)
+            if self.winner() == ai:
+                messagebox.showinfo("Game Over", "AI wins!")
+                self.disable_buttons()
+            elif is_full(self.board):
+                messagebox.showinfo("Game Over", "It's a draw!")
+                self.disable_buttons()
+
+    # Function to disable all buttons after game ends
+    def disable_buttons(self):
+        for button in self.buttons:
+            button.config(state=tk.DISABLED)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play tic-tac-toe, or k in a row on a larger board, against the AI")
+    parser.add_argument('--size', type=int, default=3)
+    parser.add_argument('--k', type=int, help="stones in a row to win (default: the board size)")
+    parser.add_argument('--budget', type=float, default=1.0, help="AI seconds per move on boards other than 3x3")
+    parser.add_argument('--solve', action='store_true', help="precompute every 3x3 AI move at startup")
+    parser.add_argument('--bench', action='store_true', help="time the 3x3 search instead of playing")
+    args = parser.parse_args()
+    if args.bench:
+        benchmark()
+        return
+    if args.solve:
+        solve()
+
+    # Set up the main application window
+    window = tk.Tk()
+    window.title("Tic-Tac-Toe")
+    TicTacToeApp(window, args.size, args.k, args.budget)
+
+    # Start the GUI event loop
+    window.mainloop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+import importlib.util
+import os
+import sys
+
+# "CHATBOT APPU.py" can't be imported by name, so load it once under an importable one
+_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'CHATBOT APPU.py')
+_spec = importlib.util.spec_from_file_location('chatbot_appu', _path)
+chatbot_appu = sys.modules.setdefault('chatbot_appu', importlib.util.module_from_spec(_spec))
+if not hasattr(chatbot_appu, 'respond'):
+    _spec.loader.exec_module(chatbot_appu)
+
+ChatSession = chatbot_appu.ChatSession
+GREETING = chatbot_appu.GREETING
+INTENTS = chatbot_appu.INTENTS
+IntentTable = chatbot_appu.IntentTable
+converse = chatbot_appu.converse
+match_intent = chatbot_appu.match_intent
+respond = chatbot_appu.respond
@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import random
+import time
+from collections import Counter, deque
+from datetime import datetime
+from itertools import islice
+from multiprocessing import Pool
+
+from chatbot import ChatSession, converse
+
+
+def read_sessions(path):
+    """Yield (session_id, messages) from a transcript file, one session at a time
+
+    A .jsonl file holds {"session": ..., "text": ...} lines, and consecutive
+    lines with the same session form one conversation. Any other file is
+    plain text with one message per line and a blank line between sessions,
+    numbered from 0. Either way a session's first message answers the
+    chatbot's greeting with the user's name, as in simple_chatbot.
+    """
+    with open(path, encoding='utf-8') as f:
+        if path.endswith(('.jsonl', '.ndjson')):
+            session_id, messages = None, []
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record['session'] != session_id and messages:
+                    yield session_id, messages
+                    messages = []
+                session_id = record['session']
+                messages.append(record['text'])
+            if messages:
+                yield session_id, messages
+        else:
+            session_id, messages = 0, []
+            for line in f:
+                line = line.rstrip('\r\n')
+                if line.strip():
+                    messages.append(line)
+                elif messages:
+                    yield session_id, messages
+                    session_id, messages = session_id + 1, []
+            if messages:
+                yield session_id, messages
+
+
+def _replay(batch):
+    """Run a batch of sessions through the chatbot; returns output records, intent counts and seconds"""
+    seed, clock_time, sessions = batch
+    clock = datetime.now if clock_time is None else (lambda: clock_time)
+    records, counts, seconds = [], Counter(), Counter()
+    for session_id, messages in sessions:
+        # Seeded per session, so jokes and facts don't depend on which worker ran it
+        session = ChatSession(rng=random.Random(f'{seed}:{session_id}'), clock=clock)
+        for turn, text in enumerate(messages):
+            if session.done:
+                counts['after_bye'] += len(messages) - turn
+                break
+            start = time.perf_counter()
+            intent, reply = converse(session, text)
+            seconds[intent] += time.perf_counter() - start
+            counts[intent] += 1
+            records.append({'session': session_id, 'turn': turn, 'intent': intent, 'text': text, 'reply': reply})
+    return records, counts, seconds, len(sessions)
+
+
+def _batches(sessions, seed, clock_time, batch_size):
+    while True:
+        batch = list(islice(sessions, batch_size))
+        if not batch:
+            return
+        yield seed, clock_time, batch
+
+
+def run_transcript(path, output_path, processes=None, batch_size=256, seed=0, clock_time=None):
+    """Replay every session of a transcript through the chatbot on a process pool
+
+    Writes one JSON line per message (session, turn, intent, text, reply)
+    in transcript order, whatever the number of processes, and returns
+    sessions, messages, timing and per-intent hit counts and seconds.
+    Messages after a session says goodbye are skipped and counted as
+    'after_bye'. Pass clock_time (a datetime) to make 'time' replies
+    repeatable too.
+    """
+    processes = processes or os.cpu_count()
+    counts, seconds = Counter(), Counter()
+    sessions = 0
+    start = time.perf_counter()
+    with Pool(processes) as pool, open(output_path, 'w', encoding='utf-8') as output:
+        pending = deque()  # In-flight batches, in transcript order; bounded so huge files stream
+        batches = _batches(read_sessions(path), seed, clock_time, batch_size)
+        for batch in batches:
+            pending.append(pool.apply_async(_replay, (batch,)))
+            if len(pending) >= 4 * processes:
+                sessions += _write(pending.popleft().get(), output, counts, seconds)
+        while pending:
+            sessions += _write(pending.popleft().get(), output, counts, seconds)
+    elapsed = time.perf_counter() - start
+    messages = sum(count for intent, count in counts.items() if intent != 'after_bye')
+    return {
+        'sessions': sessions,
+        'messages': messages,
+        'seconds': elapsed,
+        'messages_per_sec': messages / elapsed if elapsed else 0.0,
+        'intents': {intent: {'count': count, 'seconds': seconds[intent]}
+                    for intent, count in counts.most_common()},
+    }
+
+
+def _write(result, output, counts, seconds):
+    records, batch_counts, batch_seconds, sessions = result
+    output.writelines(json.dumps(record) + '\n' for record in records)
+    counts.update(batch_counts)
+    seconds.update(batch_seconds)
+    return sessions
+
+
+def write_synthetic_transcript(path, n_sessions, messages_per_session=10, seed=0):
+    """A JSON-lines transcript of synthetic conversations, for measuring throughput"""
+    from chatbot_bench import synthetic_utterances
+
+    rng = random.Random(seed)
+    utterances = synthetic_utterances(n_sessions * messages_per_session, words=8, seed=seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        for session_id in range(n_sessions):
+            messages = [f'user{rng.randrange(100000)}']
+            messages += utterances[session_id * messages_per_session:(session_id + 1) * messages_per_session]
+            for text in messages:
+                f.write(json.dumps({'session': session_id, 'text': text}) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay chatbot transcripts in bulk for QA and analytics")
+    parser.add_argument('transcript', help="JSON-lines (session, text) or blank-line separated text transcript")
+    parser.add_argument('--output', default='chatbot_replies.jsonl')
+    parser.add_argument('--stats', help="also write the counts and timings to this JSON file")
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--batch-size', type=int, default=256, help="sessions per task")
+    parser.add_argument('--seed', type=int, default=0, help="seed for joke and fact choices")
+    parser.add_argument('--clock', help="fixed ISO time for 'time' replies, e.g. 2024-01-01T12:00:00")
+    parser.add_argument('--synthetic', type=int, default=0,
+                        help="first write a synthetic transcript of this many sessions to the transcript path")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        write_synthetic_transcript(args.transcript, args.synthetic, seed=args.seed)
+    clock_time = datetime.fromisoformat(args.clock) if args.clock else None
+    stats = run_transcript(args.transcript, args.output, args.processes, args.batch_size, args.seed, clock_time)
+    print(f"{stats['sessions']} sessions, {stats['messages']} messages in {stats['seconds']:.2f}s "
+          f"({stats['messages_per_sec']:,.0f} messages/sec on {args.processes} processes)")
+    for intent, hits in stats['intents'].items():
+        mean = hits['seconds'] / hits['count'] * 1e6 if intent != 'after_bye' else 0.0
+        print(f"{intent:<16} {hits['count']:>10} {mean:>8.2f} us")
+    if args.stats:
+        with open(args.stats, 'w') as f:
+            json.dump(stats, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import argparse
+import json
+import random
+import time
+from collections import Counter
+
+from chatbot import INTENTS, ChatSession, IntentTable, match_intent, respond
+
+# Filler words for synthetic utterances, including some that contain keywords as substrings
+FILLER = ("the a an i you we it is was this that some sometimes thing nothing think thistle goodness "
+          "badge sadly whitening anytime really just could would maybe today tomorrow please "
+          "question answer movie book music weekend morning evening coffee tea work school").split()
+
+
+def substring_intent(text, intents=INTENTS):
+    """The intent the original if/elif chain of substring tests picked, for comparison"""
+    text = text.lower()
+    for intent, keywords in intents:
+        if any(keyword in text for keyword in keywords if keyword != 'goodbye'):
+            return intent
+    return None
+
+
+def synthetic_intents(n):
+    """The chatbot's intents padded to n intents of two made-up keywords each"""
+    intents = list(INTENTS)
+    for i in range(len(intents), n):
+        intents.append((f'intent{i}', [f'kwa{i}', f'kwb{i} phrase']))
+    return intents
+
+
+def synthetic_utterances(n, words=8, keyword_share=0.5, seed=0, filler=FILLER):
+    """n utterances of about `words` filler words; keyword_share of them contain one intent keyword"""
+    rng = random.Random(seed)
+    keywords = [keyword for _, intent_keywords in INTENTS for keyword in intent_keywords]
+    utterances = []
+    for _ in range(n):
+        tokens = [rng.choice(filler) for _ in range(words)]
+        if rng.random() < keyword_share:
+            tokens.insert(rng.randrange(len(tokens) + 1), rng.choice(keywords))
+        utterances.append(' '.join(tokens))
+    return utterances
+
+
+def throughput(name, func, utterances):
+    start = time.perf_counter()
+    for text in utterances:
+        func(text)
+    elapsed = time.perf_counter() - start
+    return {
+        'scenario': name,
+        'utterances': len(utterances),
+        'per_sec': len(utterances) / elapsed,
+        'us_each': elapsed / len(utterances) * 1e6,
+    }
+
+
+def run(n, lengths, intent_counts, seed):
+    results = []
+    for words in lengths:
+        utterances = synthetic_utterances(n, words, seed=seed)
+        results.append(throughput(f'substring chain, {words} words', substring_intent, utterances))
+        results.append(throughput(f'intent table, {words} words', match_intent, utterances))
+        # How often whole-word matching disagrees with raw substrings on the same corpus
+        changed = sum(1 for text in utterances if substring_intent(text) != match_intent(text))
+        results[-1]['differs_from_substring'] = changed / len(utterances)
+        session = ChatSession('bench', rng=random.Random(seed))
+        results.append(throughput(f'respond(), {words} words', lambda text: respond(session, text), utterances))
+
+    # Text without keywords is the worst case for the chain: every test scans all of it
+    keywords = [keyword for _, intent_keywords in INTENTS for keyword in intent_keywords]
+    clean = [word for word in FILLER if not any(keyword in word for keyword in keywords)]
+    utterances = synthetic_utterances(n, lengths[0], keyword_share=0.0, seed=seed, filler=clean)
+    for count in intent_counts:
+        intents = synthetic_intents(count)
+        table = IntentTable(intents)
+        results.append(throughput(f'substring chain, {count} intents', lambda text: substring_intent(text, intents),
+                                  utterances))
+        results.append(throughput(f'intent table, {count} intents', table.match, utterances))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Intent matching throughput on synthetic utterances")
+    parser.add_argument('--utterances', type=int, default=100000)
+    parser.add_argument('--lengths', type=int, nargs='+', default=[8, 64, 512], help="words per utterance")
+    parser.add_argument('--intent-counts', type=int, nargs='+', default=[13, 100, 1000],
+                        help="intent table sizes to scale to, at the first length")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--intents', action='store_true', help="also print the intent counts of the corpus")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = run(args.utterances, args.lengths, args.intent_counts, args.seed)
+    for result in results:
+        line = f"{result['scenario']:<32} {result['per_sec']:>12,.0f}/s {result['us_each']:>9.2f} us"
+        if 'differs_from_substring' in result:
+            line += f"  ({result['differs_from_substring']:.1%} differ from substring matching)"
+        print(line)
+    if args.intents:
+        counts = Counter(match_intent(text) for text in synthetic_utterances(args.utterances, args.lengths[0],
+                                                                             seed=args.seed))
+        for intent, count in counts.most_common():
+            print(f"{intent or 'unknown':<12} {count}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
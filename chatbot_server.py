@@ -0,0 +1,259 @@
+import asyncio
+import multiprocessing
+import os
+import socket
+import time
+import tracemalloc
+from collections import OrderedDict
+
+from chatbot import GREETING, ChatSession, respond
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# A client sending this much without a newline is dropped
+MAX_LINE = 64 * 1024
+
+
+def rss_bytes():
+    """Current resident set size of this process, or 0 where it can't be read"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        if resource is None:
+            return 0
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # Peak, not current, off Linux
+
+
+def raise_open_file_limit():
+    """Allow as many open sockets as the hard limit does (a no-op without the resource module)"""
+    if resource is not None:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (resource.getrlimit(resource.RLIMIT_NOFILE)[1],) * 2)
+
+
+class ChatProtocol(asyncio.Protocol):
+    """One connection and its conversation: text lines in, 'Chatbot: ...' lines out
+
+    A protocol rather than a stream reader/writer pair plus a task, so an
+    idle session costs a transport, this object and its ChatSession. The
+    session is a state machine driven by respond(): follow-up questions
+    (favorite color or food, feedback) just set what the next line answers.
+    """
+    __slots__ = ('server', 'transport', 'session', 'buffer')
+
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.session = None
+        self.buffer = b''  # Start of a line still being received
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.session = ChatSession()
+        self.server.opened(self)
+        transport.write(f"{GREETING}\n".encode('utf-8'))
+
+    def data_received(self, data):
+        self.server.touch(self)
+        *lines, self.buffer = (self.buffer + data).split(b'\n')
+        if len(self.buffer) > MAX_LINE:
+            self.transport.close()
+            return
+        for line in lines:
+            reply = respond(self.session, line.decode('utf-8', 'replace').rstrip('\r'))
+            self.server.messages += 1
+            self.transport.write(f"Chatbot: {reply}\n".encode('utf-8'))
+            if self.session.done:
+                self.transport.close()
+                return
+
+    def connection_lost(self, exc):
+        self.server.closed(self)
+
+
+class ChatServer:
+    """Many chatbot sessions at once over plain TCP, one session per connection
+
+    Connections are kept least recently active first, so evicting the ones
+    idle for idle_timeout seconds only looks at those about to go.
+    """
+
+    def __init__(self, idle_timeout=300.0, sweep_interval=1.0):
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self.connections = OrderedDict()  # ChatProtocol -> None
+        self.served = 0
+        self.evicted = 0
+        self.messages = 0
+        self.server = None
+        self._sweeper = None
+
+    def opened(self, protocol):
+        protocol.session.last_active = time.monotonic()
+        self.connections[protocol] = None
+        self.served += 1
+
+    def touch(self, protocol):
+        protocol.session.last_active = time.monotonic()
+        self.connections.move_to_end(protocol)
+
+    def closed(self, protocol):
+        self.connections.pop(protocol, None)
+
+    def evict_idle(self):
+        """Close every session idle for idle_timeout seconds or more"""
+        deadline = time.monotonic() - self.idle_timeout
+        evicted = 0
+        while self.connections:
+            protocol = next(iter(self.connections))
+            if protocol.session.last_active > deadline:
+                break
+            del self.connections[protocol]
+            protocol.transport.write(b"Chatbot: Closing this session after being idle for a while. Bye!\n")
+            protocol.transport.close()
+            evicted += 1
+        self.evicted += evicted
+        return evicted
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.evict_idle()
+
+    async def start(self, host='127.0.0.1', port=8766):
+        loop = asyncio.get_running_loop()
+        self.server = await loop.create_server(lambda: ChatProtocol(self), host, port, backlog=4096)
+        self._sweeper = asyncio.create_task(self._sweep())
+
+    async def serve(self, host='127.0.0.1', port=8766):
+        """Listen until cancelled"""
+        await self.start(host, port)
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def stop(self):
+        self._sweeper.cancel()
+        self.server.close()
+        for protocol in list(self.connections):
+            protocol.transport.close()
+        await self.server.wait_closed()
+
+    def stats(self):
+        return {'sessions': len(self.connections), 'served': self.served,
+                'evicted': self.evicted, 'messages': self.messages}
+
+
+def _read_line(sock, pending):
+    while b'\n' not in pending[sock]:
+        data = sock.recv(4096)
+        if not data:
+            raise ConnectionError("server closed the connection")
+        pending[sock] += data
+    line, pending[sock] = pending[sock].split(b'\n', 1)
+    return line
+
+
+def _bench_clients(host, port, n_sessions, rounds, pipe):
+    """Client process for the benchmark: open the sessions, go idle, then chat on all of them"""
+    raise_open_file_limit()
+    sockets, pending = [], {}
+    start = time.perf_counter()
+    for i in range(n_sessions):
+        sock = socket.create_connection((host, port))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        pending[sock] = b''
+        _read_line(sock, pending)  # Greeting
+        sock.sendall(f"user{i}\n".encode('utf-8'))
+        _read_line(sock, pending)
+        sockets.append(sock)
+    pipe.send(('open', time.perf_counter() - start))
+
+    pipe.recv()
+    start = time.perf_counter()
+    messages = ("hello", "how are you", "my favorite color", "green", "tell me a joke", "what time is it")
+    for r in range(rounds):
+        # One message on every session, then collect the replies
+        text = f"{messages[r % len(messages)]}\n".encode('utf-8')
+        for sock in sockets:
+            sock.sendall(text)
+        for sock in sockets:
+            _read_line(sock, pending)
+    pipe.send(('active', rounds * len(sockets), time.perf_counter() - start))
+
+    # The server now evicts every session; each should get a closing line and EOF
+    pipe.recv()
+    closed = 0
+    for sock in sockets:
+        try:
+            _read_line(sock, pending)
+            closed += sock.recv(1) == b''
+        except ConnectionError:
+            pass
+        sock.close()
+    pipe.send(('evicted', closed))
+
+
+async def bench(host, port, n_sessions, rounds):
+    """Hold n_sessions idle sessions, report memory per session, then chat on all of them and evict them"""
+    raise_open_file_limit()
+    loop = asyncio.get_running_loop()
+    server = ChatServer()
+    await server.start(host, port)
+    parent, child = multiprocessing.Pipe()
+    clients = multiprocessing.get_context('spawn').Process(
+        target=_bench_clients, args=(host, port, n_sessions, rounds, child))
+    clients.start()
+
+    tracemalloc.start()
+    heap_before, rss_before = tracemalloc.get_traced_memory()[0], rss_bytes()
+    _, seconds = await loop.run_in_executor(None, parent.recv)
+    heap_after, rss_after = tracemalloc.get_traced_memory()[0], rss_bytes()
+    tracemalloc.stop()
+    sessions = len(server.connections)
+    print(f"{sessions} sessions opened in {seconds:.1f}s ({sessions / seconds:,.0f}/s)")
+    print(f"memory per idle session: {(heap_after - heap_before) / sessions:,.0f} bytes of Python objects, "
+          f"{(rss_after - rss_before) / sessions:,.0f} bytes RSS")
+
+    parent.send('chat')
+    _, messages, seconds = await loop.run_in_executor(None, parent.recv)
+    print(f"{messages} messages over {sessions} sessions in {seconds:.1f}s ({messages / seconds:,.0f} msg/s)")
+
+    start = time.perf_counter()
+    server.idle_timeout = 0.0
+    server.evict_idle()
+    parent.send('evict')
+    _, closed = await loop.run_in_executor(None, parent.recv)
+    print(f"evicted {server.evicted} idle sessions in {time.perf_counter() - start:.2f}s "
+          f"({closed} clients saw the close), {len(server.connections)} left")
+    clients.join()
+    await server.stop()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve the chatbot to many clients at once over TCP")
+    parser.add_argument('mode', choices=['serve', 'bench'], nargs='?', default='serve',
+                        help="bench opens --sessions sessions from a client process and reports memory and msg/s")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--idle-timeout', type=float, default=300.0, help="seconds before an idle session is closed")
+    parser.add_argument('--sessions', type=int, default=10000)
+    parser.add_argument('--rounds', type=int, default=6, help="messages per session in the bench's chat phase")
+    args = parser.parse_args()
+
+    if args.mode == 'bench':
+        asyncio.run(bench(args.host, args.port, args.sessions, args.rounds))
+        return
+    print(f"Chatbot listening on {args.host}:{args.port} (try: nc {args.host} {args.port})")
+    try:
+        asyncio.run(ChatServer(args.idle_timeout).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import math
+import time
+from operator import itemgetter
+
+# The classic 3x3 game the GUI plays: the human moves first
+human = 'O'
+ai = 'X'
+
+# Every line of three, checked by check_winner
+WINNING_COMBINATIONS = [
+    [0, 1, 2], [3, 4, 5], [6, 7, 8],  # Rows
+    [0, 3, 6], [1, 4, 7], [2, 5, 8],  # Columns
+    [0, 4, 8], [2, 4, 6]              # Diagonals
+]
+
+# The 8 rotations and reflections of the board, as index permutations
+_ROTATE = [6, 3, 0, 7, 4, 1, 8, 5, 2]
+_MIRROR = [2, 1, 0, 5, 4, 3, 8, 7, 6]
+SYMMETRIES = []
+for _permutation in (list(range(9)), _MIRROR):
+    for _ in range(4):
+        SYMMETRIES.append(_permutation)
+        _permutation = [_permutation[j] for j in _ROTATE]
+_SYMMETRY_GETTERS = [itemgetter(*permutation) for permutation in SYMMETRIES]
+
+# Bound flags of transposition table entries
+EXACT, LOWER, UPPER = 0, 1, 2
+
+# (canonical board, is_maximizing) -> (flag, score relative to that position); shared by all searches
+transposition_table = {}
+use_transposition_table = True
+# Board string -> the AI's move, for every position it can face; filled by solve()
+solution_table = {}
+# Positions visited and transposition table cutoffs since the last reset_stats()
+search_stats = {'nodes': 0, 'table_hits': 0}
+
+
+def reset_stats():
+    search_stats['nodes'] = 0
+    search_stats['table_hits'] = 0
+
+
+# Function to print the board to the console (for debugging)
+def print_board(board):
+    for row in [board[i*3:(i+1)*3] for i in range(3)]:
+        print(row)
+    print()
+
+# Function to check if the board is full
+def is_full(board):
+    return ' ' not in board
+
+# Function to check for a win
+def check_winner(board):
+    for combo in WINNING_COMBINATIONS:
+        if board[combo[0]] == board[combo[1]] == board[combo[2]] != ' ':
+            return board[combo[0]]
+    return None
+
+# Smallest of the board's 8 symmetric images, so equivalent positions share table entries
+def canonical(board):
+    return min(getter(board) for getter in _SYMMETRY_GETTERS)
+
+# Scores count down with depth (10 - depth for a win), so the table stores them
+# relative to the position; shifting keeps their order, so bounds stay bounds
+def _to_table(score, depth):
+    return score + depth if score > 0 else score - depth if score < 0 else 0
+
+def _from_table(score, depth):
+    return score - depth if score > 0 else score + depth if score < 0 else 0
+
+# Minimax function with Alpha-Beta Pruning and a transposition table
+def minimax(board, depth, alpha, beta, is_maximizing):
+    search_stats['nodes'] += 1
+    winner = check_winner(board)
+    if winner == ai:
+        return 10 - depth
+    elif winner == human:
+        return depth - 10
+    elif is_full(board):
+        return 0
+
+    alpha_original, beta_original = alpha, beta
+    if use_transposition_table:
+        key = (canonical(board), is_maximizing)
+        entry = transposition_table.get(key)
+        if entry is not None:
+            flag, score = entry
+            score = _from_table(score, depth)
+            if flag == EXACT:
+                search_stats['table_hits'] += 1
+                return score
+            if flag == LOWER:
+                alpha = max(alpha, score)
+            else:
+                beta = min(beta, score)
+            if beta <= alpha:
+                search_stats['table_hits'] += 1
+                return score
+
+    if is_maximizing:
+        max_eval = -math.inf
+        for i in range(9):
+            if board[i] == ' ':
+                board[i] = ai
+                eval = minimax(board, depth + 1, alpha, beta, False)
+                board[i] = ' '
+                max_eval = max(max_eval, eval)
+                alpha = max(alpha, eval)
+                if beta <= alpha:
+                    break
+        result = max_eval
+    else:
+        min_eval = math.inf
+        for i in range(9):
+            if board[i] == ' ':
+                board[i] = human
+                eval = minimax(board, depth + 1, alpha, beta, True)
+                board[i] = ' '
+                min_eval = min(min_eval, eval)
+                beta = min(beta, eval)
+                if beta <= alpha:
+                    break
+        result = min_eval
+
+    if use_transposition_table:
+        # Outside the original window the score is only a bound on the true one
+        if result <= alpha_original:
+            flag = UPPER
+        elif result >= beta_original:
+            flag = LOWER
+        else:
+            flag = EXACT
+        transposition_table[key] = (flag, _to_table(result, depth))
+    return result
+
+# The AI's move on a board: the first empty cell with the highest minimax score
+def best_move(board):
+    move = solution_table.get(''.join(board))
+    if move is not None:
+        return move
+    best_score = -math.inf
+    move = None
+    for i in range(9):
+        if board[i] == ' ':
+            board[i] = ai
+            score = minimax(board, 0, -math.inf, math.inf, False)
+            board[i] = ' '
+            if score > best_score:
+                best_score = score
+                move = i
+    return move
+
+# Precompute the AI's move for every position it can face (the human moves first),
+# so each move during play is one dictionary lookup
+def solve():
+    start = time.perf_counter()
+    seen = set()
+    stack = [[' '] * 9]
+    while stack:
+        position = stack.pop()
+        key = ''.join(position)
+        if key in seen or check_winner(position) or is_full(position):
+            continue
+        seen.add(key)
+        ai_to_move = position.count(ai) < position.count(human)
+        if ai_to_move and key not in solution_table:
+            solution_table[key] = best_move(position)
+        for i in range(9):
+            if position[i] == ' ':
+                child = list(position)
+                child[i] = ai if ai_to_move else human
+                stack.append(child)
+    return {'positions': len(solution_table), 'seconds': time.perf_counter() - start}
+
+# Time the AI's reply to every opening move with and without the tables
+def benchmark():
+    global use_transposition_table
+    openings = []
+    for i in range(9):
+        opening = [' '] * 9
+        opening[i] = human
+        openings.append(opening)
+    runs = [('plain alpha-beta', False, False), ('transposition table, cold', True, False),
+            ('transposition table, warm', True, False), ('solution table', True, True)]
+    for name, use_table, solved in runs:
+        use_transposition_table = use_table
+        if name.endswith('cold'):
+            transposition_table.clear()
+        if solved and not solution_table:
+            stats = solve()
+            print(f"solve(): {stats['positions']} positions in {stats['seconds'] * 1000:.1f} ms, "
+                  f"{len(transposition_table)} table entries")
+        reset_stats()
+        start = time.perf_counter()
+        moves = [best_move(opening) for opening in openings]
+        elapsed = time.perf_counter() - start
+        print(f"{name:<28} {elapsed * 1000:9.2f} ms for 9 openings, {search_stats['nodes']:>7} nodes, "
+              f"{search_stats['table_hits']:>5} table hits, moves {moves}")
+    use_transposition_table = True
+
+
+if __name__ == "__main__":
+    benchmark()
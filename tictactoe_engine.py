@@ -0,0 +1,294 @@
+import time
+
+# Score of a won game; a win found at ply p scores WIN - p, so quicker wins score higher
+WIN = 10 ** 12
+
+# Nodes searched between looks at the clock
+CLOCK_CHECK_INTERVAL = 1024
+
+# Transposition table entries kept before it is cleared
+MAX_TABLE_ENTRIES = 500000
+
+# Bound flags of transposition table entries
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class Game:
+    """Rules of an N x N board where k in a row wins, on integer bitboards
+
+    Cell row * size + column is bit number cell of a player's bitboard.
+    Every run of k cells along a row, column or diagonal is precomputed as
+    a mask, along with the masks through each cell, so checking a move for
+    a win takes a few ANDs and the evaluation one pass over the lines.
+    """
+
+    def __init__(self, size=3, k=None):
+        self.size = size
+        self.k = k or size
+        if not 1 <= self.k <= size:
+            raise ValueError("k must be between 1 and the board size")
+        self.cells = size * size
+        self.full = (1 << self.cells) - 1
+        self.lines = []
+        for row in range(size):
+            for column in range(size):
+                for d_row, d_column in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                    end_row, end_column = row + d_row * (self.k - 1), column + d_column * (self.k - 1)
+                    if 0 <= end_row < size and 0 <= end_column < size:
+                        mask = 0
+                        for j in range(self.k):
+                            mask |= 1 << ((row + d_row * j) * size + column + d_column * j)
+                        self.lines.append(mask)
+        self.lines_through = [[mask for mask in self.lines if mask >> cell & 1] for cell in range(self.cells)]
+        # Value of a line holding n stones of one player and none of the other
+        self.weights = [0] + [4 ** n for n in range(1, self.k + 1)]
+
+    def bits(self, cells, symbol):
+        """Bitboard of the cells holding symbol, from a list like the GUI's board"""
+        stones = 0
+        for cell, value in enumerate(cells):
+            if value == symbol:
+                stones |= 1 << cell
+        return stones
+
+    def wins(self, stones, cell):
+        """Whether the stone just placed on cell completes a line"""
+        for mask in self.lines_through[cell]:
+            if stones & mask == mask:
+                return True
+        return False
+
+    def has_line(self, stones):
+        for mask in self.lines:
+            if stones & mask == mask:
+                return True
+        return False
+
+    def evaluate(self, mine, theirs):
+        """Heuristic score for the side to move: its open lines minus the opponent's"""
+        weights = self.weights
+        score = 0
+        for mask in self.lines:
+            a = mine & mask
+            b = theirs & mask
+            if not b:
+                if a:
+                    score += weights[a.bit_count()]
+            elif not a:
+                score -= weights[b.bit_count()]
+        return score
+
+
+def _cells(bits):
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class Engine:
+    """Iterative-deepening alpha-beta (negamax) for a Game, within a time budget per move
+
+    Each iteration searches one ply deeper, trying first the best move of
+    the previous one (kept in the transposition table), then immediate
+    wins and blocks, then cells on the most open lines. When the budget
+    runs out the move of the last finished iteration is played; on small
+    boards the search reaches the end of the game and plays perfectly.
+    """
+
+    def __init__(self, game):
+        self.game = game
+        self.table = {}  # (mine, theirs) -> (depth, flag, score relative to the position, move)
+        self.nodes = 0
+        self._deadline = None
+
+    def best_move(self, mine, theirs, time_budget=1.0, max_depth=None):
+        """Move for the side holding mine, with the score, depth reached and search counts"""
+        start = time.perf_counter()
+        self.nodes = 0
+        self._deadline = start + time_budget if time_budget is not None else None
+        empties = self.game.full & ~(mine | theirs)
+        remaining = bin(empties).count('1')
+        if not remaining:
+            return {'move': None, 'score': 0, 'depth': 0, 'nodes': 0, 'seconds': 0.0, 'complete': True}
+        max_depth = min(max_depth or remaining, remaining)
+        move, score, depth = self._ordered_moves(mine, theirs, empties, None)[0], 0, 0
+        complete = False
+        try:
+            for iteration in range(1, max_depth + 1):
+                score, move = self._root(mine, theirs, empties, iteration)
+                depth = iteration
+                # Proven results and full-depth searches won't change with more depth
+                if abs(score) >= WIN - self.game.cells or iteration == remaining:
+                    complete = True
+                    break
+        except SearchTimeout:
+            pass
+        if len(self.table) > MAX_TABLE_ENTRIES:
+            self.table.clear()
+        elapsed = time.perf_counter() - start
+        return {'move': move, 'score': score, 'depth': depth, 'nodes': self.nodes,
+                'seconds': elapsed, 'complete': complete}
+
+    def _root(self, mine, theirs, empties, depth):
+        alpha, beta = -WIN - 1, WIN + 1
+        entry = self.table.get((mine, theirs))
+        best_move = None
+        for cell in self._ordered_moves(mine, theirs, empties, entry[3] if entry else None):
+            stones = mine | 1 << cell
+            if self.game.wins(stones, cell):
+                score = WIN - 1
+            else:
+                score = -self._negamax(theirs, stones, depth - 1, -beta, -alpha, 1)
+            if best_move is None or score > alpha:
+                alpha, best_move = score, cell
+        self.table[(mine, theirs)] = (depth, EXACT, alpha, best_move)
+        return alpha, best_move
+
+    def _negamax(self, mine, theirs, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self._deadline is not None and not self.nodes % CLOCK_CHECK_INTERVAL:
+            if time.perf_counter() > self._deadline:
+                raise SearchTimeout
+        empties = self.game.full & ~(mine | theirs)
+        if not empties:
+            return 0
+        if depth == 0:
+            return self.game.evaluate(mine, theirs)
+
+        key = (mine, theirs)
+        entry = self.table.get(key)
+        tt_move = None
+        if entry is not None:
+            entry_depth, flag, score, tt_move = entry
+            if entry_depth >= depth:
+                score = _from_table(score, ply)
+                if flag == EXACT:
+                    return score
+                if flag == LOWER:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score
+
+        alpha_original = alpha
+        best_score, best_move = -WIN - 1, None
+        for cell in self._ordered_moves(mine, theirs, empties, tt_move):
+            stones = mine | 1 << cell
+            if self.game.wins(stones, cell):
+                best_score, best_move = WIN - ply - 1, cell  # Nothing beats winning now
+                break
+            score = -self._negamax(theirs, stones, depth - 1, -beta, -alpha, ply + 1)
+            if score > best_score:
+                best_score, best_move = score, cell
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if best_score <= alpha_original:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.table[key] = (depth, flag, _to_table(best_score, ply), best_move)
+        return best_score
+
+    def _ordered_moves(self, mine, theirs, empties, tt_move):
+        """Empty cells, most promising first: the table's move, then by the lines they extend or block"""
+        game = self.game
+        weights = game.weights
+        threat = weights[game.k]
+        scored = []
+        for cell in _cells(empties):
+            score = 0
+            for mask in game.lines_through[cell]:
+                a = mine & mask
+                b = theirs & mask
+                if not b:
+                    count = a.bit_count()
+                    # Completing a line outranks everything, blocking one comes next
+                    score += 4 * threat if count == game.k - 1 else weights[count] + 1
+                if not a:
+                    count = b.bit_count()
+                    score += 2 * threat if count == game.k - 1 else weights[count]
+            scored.append((-score, cell))
+        scored.sort()
+        moves = [cell for _, cell in scored]
+        if tt_move is not None and tt_move in moves:
+            moves.remove(tt_move)
+            moves.insert(0, tt_move)
+        return moves
+
+
+# Win scores depend on the ply they were found at, so the table stores them
+# relative to the position; the shift keeps their order, so bounds stay bounds
+def _to_table(score, ply):
+    return score + ply if score > WIN // 2 else score - ply if score < -WIN // 2 else score
+
+
+def _from_table(score, ply):
+    return score - ply if score > WIN // 2 else score + ply if score < -WIN // 2 else score
+
+
+def self_play(game, time_budget=1.0, max_depth=None, engine=None, opening=()):
+    """Play the engine against itself; returns the winner ('X', 'O' or None) and per-move results"""
+    engine = engine or Engine(game)
+    stones = {'X': 0, 'O': 0}
+    player, other = 'X', 'O'
+    moves = []
+    for cell in opening:
+        stones[player] |= 1 << cell
+        player, other = other, player
+    while True:
+        if game.has_line(stones[other]):
+            return other, moves
+        if stones['X'] | stones['O'] == game.full:
+            return None, moves
+        result = engine.best_move(stones[player], stones[other], time_budget, max_depth)
+        stones[player] |= 1 << result['move']
+        moves.append(result)
+        player, other = other, player
+
+
+def format_board(game, x_stones, o_stones):
+    rows = []
+    for row in range(game.size):
+        rows.append(' '.join('X' if x_stones >> cell & 1 else 'O' if o_stones >> cell & 1 else '.'
+                             for cell in range(row * game.size, (row + 1) * game.size)))
+    return '\n'.join(rows)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Self-play an N x N, k-in-a-row game with the bitboard engine")
+    parser.add_argument('--size', type=int, default=4)
+    parser.add_argument('--k', type=int, help="stones in a row to win (default: the board size)")
+    parser.add_argument('--budget', type=float, default=1.0, help="seconds per move")
+    parser.add_argument('--max-depth', type=int)
+    args = parser.parse_args()
+
+    game = Game(args.size, args.k)
+    winner, moves = self_play(game, args.budget, args.max_depth)
+    x_stones = o_stones = 0
+    for i, result in enumerate(moves):
+        if i % 2:
+            o_stones |= 1 << result['move']
+        else:
+            x_stones |= 1 << result['move']
+        print(f"{'XO'[i % 2]} plays {divmod(result['move'], game.size)}: depth {result['depth']}"
+              f"{' (solved)' if result['complete'] else ''}, score {result['score']}, {result['nodes']} nodes "
+              f"in {result['seconds']:.2f}s ({result['nodes'] / max(result['seconds'], 1e-9):,.0f} nodes/s)")
+    print(format_board(game, x_stones, o_stones))
+    print(f"winner: {winner or 'draw'}")
+
+
+if __name__ == "__main__":
+    main()
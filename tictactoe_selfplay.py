@@ -0,0 +1,93 @@
+import argparse
+import json
+import os
+import random
+import time
+from collections import Counter
+from multiprocessing import Pool
+
+from tictactoe_engine import Engine, Game, self_play
+
+# Engine of this worker process, reused across its games so the transposition table carries over
+_worker = {}
+
+
+def _init_worker(size, k):
+    game = Game(size, k)
+    _worker['game'], _worker['engine'] = game, Engine(game)
+
+
+def _play_games(batch):
+    """Play a batch of games from seeded random openings; returns their outcomes and search counts"""
+    seeds, random_moves, time_budget, max_depth = batch
+    game, engine = _worker['game'], _worker['engine']
+    results = []
+    for seed in seeds:
+        rng = random.Random(seed)
+        # Fewer than 2k - 1 random moves can't complete a line, so every game is still open
+        opening = rng.sample(range(game.cells), min(random_moves, 2 * game.k - 2, game.cells))
+        winner, moves = self_play(game, time_budget, max_depth, engine, opening)
+        results.append((winner, len(opening) + len(moves), sum(move['nodes'] for move in moves),
+                        sum(move['seconds'] for move in moves)))
+    return results
+
+
+def run_selfplay(n_games, size=3, k=None, time_budget=None, max_depth=None, random_moves=2,
+                 processes=None, batch_size=16, seed=0):
+    """Play n_games engine-vs-engine games on a process pool and summarize throughput and outcomes"""
+    processes = processes or os.cpu_count()
+    batches = [(list(range(seed + start, seed + min(start + batch_size, n_games))), random_moves, time_budget, max_depth)
+               for start in range(0, n_games, batch_size)]
+    outcomes = Counter()
+    moves = nodes = 0
+    search_seconds = 0.0
+    start = time.perf_counter()
+    with Pool(processes, initializer=_init_worker, initargs=(size, k)) as pool:
+        for results in pool.imap_unordered(_play_games, batches):
+            for winner, game_moves, game_nodes, game_seconds in results:
+                outcomes[winner or 'draw'] += 1
+                moves += game_moves
+                nodes += game_nodes
+                search_seconds += game_seconds
+    elapsed = time.perf_counter() - start
+    return {
+        'games': n_games,
+        'seconds': elapsed,
+        'games_per_sec': n_games / elapsed if elapsed else 0.0,
+        'nodes': nodes,
+        'nodes_per_sec': nodes / elapsed if elapsed else 0.0,
+        'nodes_per_search_sec': nodes / search_seconds if search_seconds else 0.0,
+        'mean_moves': moves / n_games if n_games else 0.0,
+        'outcomes': {outcome: outcomes[outcome] for outcome in ('X', 'O', 'draw')},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless engine self-play across a process pool")
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--size', type=int, default=3)
+    parser.add_argument('--k', type=int, help="stones in a row to win (default: the board size)")
+    parser.add_argument('--budget', type=float, help="seconds per move (default: no limit)")
+    parser.add_argument('--max-depth', type=int, help="plies searched per move (default: to the end)")
+    parser.add_argument('--random-moves', type=int, default=2, help="random opening moves, for varied games")
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--batch-size', type=int, default=16, help="games per task")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    stats = run_selfplay(args.games, args.size, args.k, args.budget, args.max_depth, args.random_moves,
+                         args.processes, args.batch_size, args.seed)
+    outcomes = stats['outcomes']
+    print(f"{stats['games']} games in {stats['seconds']:.2f}s ({stats['games_per_sec']:,.1f} games/sec "
+          f"on {args.processes} processes), {stats['mean_moves']:.1f} moves per game")
+    print(f"{stats['nodes']:,} nodes ({stats['nodes_per_sec']:,.0f} nodes/sec, "
+          f"{stats['nodes_per_search_sec']:,.0f} per search second)")
+    print(f"X wins {outcomes['X']}, O wins {outcomes['O']}, draws {outcomes['draw']}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(stats, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()